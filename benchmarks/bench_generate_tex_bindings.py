@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# usage: bench_generate_tex_bindings.py [--sizes 600,5000,50000] [--repeat N] [--json FILE]
+#
+# time each stage of generate_tex_bindings.py on synthetic icon sets, so that
+# regressions show up before upgrading to much larger fonts; otftotfm is
+# replaced by a local stand-in, so no TeX install is needed
+
+import sys, argparse;
+import os, io, json, shutil;
+import importlib.util, tempfile, contextlib;
+import time;
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)));
+
+# stand-ins
+# ------------------------------------------------------------------------------
+# otftotfm writes an empty tfm and pfb, named like the real ones, and prints the
+# map line; the built-in tfm writer and the metrics tables read the real font,
+# where the synthetic glyphs are missing, so that they measure the font parse
+# rather than the tfms and the metrics of every icon
+OTFTOTFM = """\
+#!{python}
+import sys, os;
+options = dict(arg.split('=', 1) for arg in sys.argv[2:] if '=' in arg);
+encoding = os.path.splitext(os.path.basename(options['--literal-encoding']))[0];
+open(os.path.join(options['--tfm-directory'], 'FontAwesome--' + encoding + '.tfm'), 'wb').close();
+open(os.path.join(options['--type1-directory'], 'FontAwesome.pfb'), 'wb').close();
+print('FontAwesome--{{0}} FontAwesome "{{0}} ReEncodeFont" <[{{0}}.enc <FontAwesome.pfb'.format(encoding));
+""";
+
+def load_generator(directory):
+  with open(os.path.join(directory, 'otftotfm'), 'w') as f:
+    f.write(OTFTOTFM.format(python=sys.executable));
+  os.chmod(os.path.join(directory, 'otftotfm'), 0o755);
+  shutil.copy(os.path.join(ROOT, 'FontAwesome.otf'), directory);
+  os.environ['PATH'] = directory + os.pathsep + os.environ['PATH'];
+  spec = importlib.util.spec_from_file_location('generate_tex_bindings', os.path.join(ROOT, 'generate_tex_bindings.py'));
+  generator = importlib.util.module_from_spec(spec);
+  spec.loader.exec_module(generator);
+  generator.args = argparse.Namespace(force=True, jobs=os.cpu_count());
+  return generator;
+
+# synthetic icon sets
+# ------------------------------------------------------------------------------
+# every 4th icon gets an alias, and every 16th a chain of two aliases spread
+# over two rules, so that recurse_dictionary has to follow them
+def icon_name(i):
+  return '{}icon-{}'.format(chr(ord('a') + i % 26), i);
+
+def synthesize(count):
+  css = [];
+  glyphs_names = ['.notdef'];
+  cmap = {};
+  for i in range(count):
+    name = icon_name(i);
+    selectors = ['.fa-{}:before'.format(name)];
+    if i % 4 == 0:
+      selectors.insert(0, '.fa-{}-alias:before'.format(name));
+    css.append("{} {{\n  content: \"\\{:x}\";\n}}\n".format(',\n'.join(selectors), 0xf0000 + i));
+    if i % 16 == 0:
+      css.append(".fa-{0}-chain:before,\n.fa-{0}-alias:before {{\n  content: \"\\{1:x}\";\n}}\n".format(name, 0xf0000 + i));
+    glyphs_names.append(name.replace('-', '_'));
+    cmap[0xf0000 + i] = glyphs_names[-1];
+  return '/* synthetic */\n' + ''.join(css), glyphs_names, cmap;
+
+# stages
+# ------------------------------------------------------------------------------
+def run_stages(generator, css, glyphs_names, cmap):
+  timings = {};
+  def timed(stage, function, *arguments):
+    start = time.perf_counter();
+    with contextlib.redirect_stdout(io.StringIO()):
+      result = function(*arguments);
+    timings[stage] = time.perf_counter() - start;
+    return result;
+
+  def collect(records):
+    glyphs = [];
+    aliases = {};
+    for glyph_names, glyph_codepoint in records:
+      glyphs.append((glyph_names[-1], glyph_codepoint));
+      for glyph_alias in glyph_names[:-1]:
+        aliases[glyph_alias] = glyph_names[-1];
+    return glyphs, aliases;
+  def resolve(aliases):
+    return dict((key, generator.recurse_dictionary(aliases, key)) for key in aliases);
+
+  records = timed('css parse', lambda: list(generator.parse_css(io.StringIO(css))));
+  glyphs, aliases = collect(records);
+  aliases = timed('alias resolution', resolve, aliases);
+  catalog = timed('catalog', generator.build_catalog, 'bench', glyphs, aliases, glyphs_names, cmap);
+  timed('generic', generator.write_generic, catalog);
+  timed('xeluatex', generator.write_xeluatex, catalog);
+  timed('lua', generator.write_lua, catalog);
+  timed('metrics', generator.write_metrics, catalog, generator.FONT);
+  timed('enc', lambda: [generator.write_enc(str(i), subfont) for i, subfont in enumerate(catalog['subfonts'], 1)]);
+  timed('pdftex', generator.write_pdftex, catalog, generator.args.jobs);
+  timed('pdftex otftotfm', generator.write_pdftex, catalog, generator.args.jobs, generator.FONT, '', True);
+  timed('doc', generator.write_doc, catalog);
+  return timings;
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark generate_tex_bindings.py on synthetic icon sets.');
+  parser.add_argument('--sizes', default='600,5000,50000', help='comma separated icon counts (default: 600,5000,50000)');
+  parser.add_argument('--repeat', type=int, default=3, help='number of runs per size, keeping the fastest (default: 3)');
+  parser.add_argument('--json', metavar='FILE', help='also write the timings to FILE');
+  args = parser.parse_args();
+  sizes = [int(size) for size in args.sizes.split(',')];
+
+  results = {};
+  cwd = os.getcwd();
+  with tempfile.TemporaryDirectory() as directory:
+    generator = load_generator(directory);
+    os.chdir(directory);
+    try:
+      for size in sizes:
+        css, glyphs_names, cmap = synthesize(size);
+        runs = [run_stages(generator, css, glyphs_names, cmap) for repeat in range(args.repeat)];
+        results[size] = dict((stage, min(run[stage] for run in runs)) for stage in runs[0]);
+    finally:
+      os.chdir(cwd);
+
+  # print a table of the fastest times, in milliseconds
+  stages = list(results[sizes[0]]);
+  print("{:<18}".format('stage') + ''.join("{:>12}".format(size) for size in sizes));
+  for stage in stages:
+    print("{:<18}".format(stage) + ''.join("{:>12.1f}".format(results[size][stage] * 1000) for size in sizes));
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(dict((str(size), results[size]) for size in sizes), f, indent=1);
+
+if __name__ == '__main__':
+  main();
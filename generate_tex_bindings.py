@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
-# usage: generate_tex_bindings.py <VERSION>
+# usage: generate_tex_bindings.py [--force] [--jobs N] [--output-dir DIR] [--mirror DIR] [--checksums FILE] [--subset FILE] [--usage FILE] [--slot-ledger FILE] [--report FILE] [--profile DIR] [--builtin-tfm] [--check-tfm DIR] [--archive FILE] [--watch] <VERSION|ZIP|DIR>...
+#   the tfm files are made by otftotfm by default; --builtin-tfm, which writes them directly, is opt-in until checked against otftotfm with --check-tfm
 
 import sys, argparse;
 import subprocess, re, os, shutil;
 import datetime;
-import fontforge;
+import hashlib, json;
+import concurrent.futures, tempfile, zipfile, tarfile, gzip, io;
+import mmap, struct, math, itertools;
+import time, resource, tracemalloc, cProfile, contextlib;
 
 DEBUG = os.environ.get('DEBUG', False); # DEBUG can be set as an environment variable when calling this script, and is set to False by default
 
+# errors stopping a build, turned into an exit by main() but left to the callers
+# of generate() to handle
+class GenerateError(Exception):
+  pass;
+
+CACHE = '.generate_tex_bindings.cache'; # build cache, storing the input hashes of each stage of the last run
+CACHE_FORMAT = 1;
+
 COPYRIGHT = """\
 %% Copyright 2015 Xavier Danaux (xdanaux@gmail.com).
 %
@@ -17,8 +29,24 @@ COPYRIGHT = """\
 
 """;
 
-numbers = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten'];
+# subfonts are named after their number spelled out, as tex control sequence
+# names can't hold digits: one, two, ..., twentyone, ..., onehundredfive, ...
+SMALL_NUMBERS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten',
+  'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen'];
+TENS = ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety'];
 
+def number_name(number):
+  if number < 20:
+    return SMALL_NUMBERS[number];
+  if number < 100:
+    return TENS[number // 10] + (SMALL_NUMBERS[number % 10] if number % 10 else '');
+  for size, word in [(10**9, 'billion'), (10**6, 'million'), (1000, 'thousand'), (100, 'hundred')]:
+    if number >= size:
+      return number_name(number // size) + word + (number_name(number % size) if number % size else '');
+
+# otf glyphs are matched to the css icons through their codepoints (see
+# join_glyph_names); these only override that match, ".notdef" dropping blank
+# glyphs from the pdftex subfonts
 pdftex_replace = {
   "space"                 : ".notdef",             #0020 (blank)
   "dieresis"              : ".notdef",             #00a8 (blank)
@@ -30,432 +58,10 @@ pdftex_replace = {
   "trademark"             : ".notdef",             #2122 (blank)
   "infinity"              : ".notdef",             #221e (blank)
   "notequal"              : ".notdef",             #2260 (blank)
-  "envelope"              : "envelope-o",          #f003
-  "star_empty"            : "star-o",              #f006
-  "ok"                    : "check",               #f00c
-  "remove"                : "times",               #f00d
-  "zoom_in"               : "search-plus",         #f00e
-  "zoom_out"              : "search-minus",        #f010
-  "off"                   : "power-off",           #f011
-  "trash"                 : "trash-o",             #f014
-  "file_alt"              : "file-o",              #f016
-  "time"                  : "clock-o",             #f017
-  "download_alt"          : "download",            #f019
-  "download"              : "arrow-circle-o-down", #f01a
-  "upload"                : "arrow-circle-o-up",   #f01b
-  "play_circle"           : "play_circle_o",       #f01d
-  "indent_left"           : "outdent",             #f03b
-  "indent_right"          : "indent",              #f03c
-  "facetime_video"        : "video-camera",        #f03d
-  "picture"               : "picture-o",           #f03e
-  "edit"                  : "pencil-square-o",     #f044
-  "share"                 : "share-square-o",      #f045
-  "check"                 : "check-square-o",      #f046
-  "move"                  : "arrows",              #f047
-  "plus_sign"             : "plus-circle",         #f055
-  "minus_sign"            : "minus-circle",        #f056
-  "remove_sign"           : "times-circle",        #f057
-  "ok_sign"               : "check-circle",        #f058
-  "question_sign"         : "question-circle",     #f059
-  "info_sign"             : "info-circle",         #f05a
-  "screenshot"            : "crosshairs",          #f05b
-  "remove_circle"         : "times-circle-o",      #f05c
-  "ok_circle"             : "check-circle-o",      #f05d
-  "ban_circle"            : "ban",                 #f05e
-  "share_alt"             : "share",               #f064
-  "resize_full"           : "expand",              #f065
-  "resize_small"          : "compress",            #f066
-  "exclamation_sign"      : "exclamation-circle",  #f06a
-  "eye_open"              : "eye",                 #f06e
-  "eye_close"             : "eye-slash",           #f070
-  "warning_sign"          : "exclamation-triangle",#f071
-  "folder_close"          : "folder",              #f07b
-  "resize_horizontal"     : "arrows-h",            #f07d
-  "resize_vertical"       : "arrows-v",            #f07e
-  "twitter_sign"          : "twitter-square",      #f081
-  "facebook_sign"         : "facebook-square",     #f082
-  "thumbs_up_alt"         : "thumbs-o-up",         #f087
-  "thumbs_down_alt"       : "thumbs-o-down",       #f088
-  "heart_empty"           : "heart-o",             #f08a
-  "signout"               : "sign-out",            #f08b
-  "linkedin_sign"         : "linkedin-square",     #f08c
-  "pushpin"               : "thumb-tack",          #f08d
-  "signin"                : "sign-in",             #f090
-  "github_sign"           : "github-square",       #f092
-  "upload_alt"            : "upload",              #f093
-  "lemon"                 : "lemon-o",             #f094
-  "check_empty"           : "square-o",            #f096
-  "bookmark_empty"        : "bookmark-o",          #f097
-  "phone_sign"            : "phone-square",        #f098
-  "hdd"                   : "hdd-o",               #f0a0
-  "bell"                  : "bell-o",              #f0a2
-  "hand_right"            : "hand-o-right",        #f0a4
-  "hand_left"             : "hand-o-left",         #f0a5
-  "hand_up"               : "hand-o-up",           #f0a6
-  "hand_down"             : "hand-o-down",         #f0a7
-  "circle_arrow_left"     : "arrow-circle-left",   #f0a8
-  "circle_arrow_right"    : "arrow-circle-right",  #f0a9
-  "circle_arrow_up"       : "arrow-circle-up",     #f0aa
-  "circle_arrow_down"     : "arrow-circle-down",   #f0ab
-  "fullscreen"            : "arrows-alt",          #f0b2
-  "group"                 : "users",               #f0c0
-  "beaker"                : "flask",               #f0c3
-  "cut"                   : "scissors",            #f0c4
-  "copy"                  : "files-o",             #f0c5
-  "paper_clip"            : "paperclip",           #f0c6
-  "save"                  : "floppy-o",            #f0c7
-  "sign_blank"            : "square",              #f0c8
-  "reorder"               : "bars",                #f0c9
-  "ul"                    : "list-ul",             #f0ca
-  "ol"                    : "list-ol",             #f0cb
-  "pinterest_sign"        : "pinterest-square",    #f0d3
-  "google_plus_sign"      : "google-plus-square",  #f0d4
-  "sort_down"             : "sort-desc",           #f0dd
-  "sort_up"               : "sort-asc",            #f0de
-  "envelope_alt"          : "envelope",            #f0e0
-  "legal"                 : "gavel",               #f0e3
-  "dashboard"             : "tachometer",          #f0e4
-  "comment_alt"           : "comment-o",           #f0e5
-  "comments_alt"          : "comments-o",          #f0e6
-  "paste"                 : "clipboard",           #f0ea
-  "light_bulb"            : "lightbulb-o",         #f0eb
-  "bell_alt"              : "bell",                #f0f3
-  "food"                  : "cutlery",             #f0f5
-  "file_text_alt"         : "file-text-o",         #f0f6
-  "building"              : "building-o",          #f0f7
-  "hospital"              : "hospital-o",          #f0f8
-  "h_sign"                : "h-square",            #f0fd
-  "f0fe"                  : "plus-square",         #f0fe
-  "double_angle_left"     : "angle-double-left",   #f100
-  "double_angle_right"    : "angle-double-right",  #f101
-  "double_angle_up"       : "angle-double-up",     #f102
-  "double_angle_down"     : "angle-double-down",   #f103
-  "mobile_phone"          : "mobile",              #f10b
-  "circle_blank"          : "circle-o",            #f10c
-  "folder_close_alt"      : "folder-o",            #f114
-  "folder_open_alt"       : "folder-open-o",       #f115
   "expand_alt"            : ".notdef",             #f116 (blank)
   "collapse_alt"          : ".notdef",             #f117 (blank)
-  "smile"                 : "smile-o",             #f118
-  "frown"                 : "frown-o",             #f119
-  "meh"                   : "meh-o",               #f11a
-  "keyboard"              : "keyboard-o",          #f11c
-  "flag_alt"              : "flag-o",              #f11d
-  "star_half_empty"       : "star-half-o",         #f123
-  "unlink"                : "chain-broken",        #f127
-  "_279"                  : "info",                #f129
-  "_283"                  : "eraser",              #f12d
-  "microphone_off"        : "microphone-slash",    #f131
-  "calendar_empty"        : "calendar-o",          #f133
-  "chevron_sign_left"     : "chevron-circle-left", #f137
-  "chevron_sign_right"    : "chevron-circle-right",#f138
-  "chevron_sign_up"       : "chevron-circle-up",   #f139
-  "chevron_sign_down"     : "chevron-circle-down", #f13a
-  "ellipsis_horizontal"   : "ellipsis-h",          #f141
-  "ellipsis_vertical"     : "ellipsis-v",          #f142
-  "_303"                  : "rss-square",          #f143
-  "play_sign"             : "play-circle",         #f144
-  "minus_sign_alt"        : "minus-square",        #f146
-  "check_minus"           : "minus-square-o",      #f147
-  "check_sign"            : "check-square",        #f14a
-  "edit_sign"             : "pencil-square",       #f14b
-  "_312"                  : "external-link-square",#f14c
-  "share_sign"            : "share-square",        #f14d
-  "collapse"              : "caret-square-o-down", #f150
-  "collapse_top"          : "caret-square-o-up",   #f151
-  "_317"                  : "caret-square-o-right",#f152
-  "sort_by_alphabet"      : "sort-alpha-asc",      #f15d
-  "_329"                  : "sort-alpha-desc",     #f15e
-  "sort_by_attributes"    : "sort-amount-asc",     #f160
-  "sort_by_attributes_alt": "sort-amount-desc",    #f161
-  "sort_by_order"         : "sort-numeric-asc",    #f162
-  "sort_by_order_alt"     : "sort-numeric-desc",   #f163
-  "_334"                  : "thumbs-up",           #f164
-  "_335"                  : "thumbs-down",         #f165
-  "youtube_sign"          : "youtube-square",      #f166
-  "xing_sign"             : "xing-square",         #f169
-  "stackexchange"         : "stack-overflow",      #f16c
-  "f171"                  : "bitbucket",           #f171
-  "bitbucket_sign"        : "bitbucket-square",    #f172
-  "tumblr_sign"           : "tumblr-square",       #f174
-  "dribble"               : "dribbble",            #f17d
-  "gittip"                : "gratipay",            #f184
-  "sun"                   : "sun-o",               #f185
-  "_366"                  : "moon-o",              #f186
-  "_372"                  : "pagelines",
-  "_374"                  : "arrow-circle-o-right",#f18e
-  "arrow_circle_alt_left" : "arrow-circle-o-left", #f190
-  "_376"                  : "caret-square-o-left", #f191
-  "dot_circle_alt"        : "dot-circle-o",        #f192
-  "_378"                  : "wheelchair",
-  "_380"                  : "try",
-  "_382"                  : "space-shuttle",
-  "_383"                  : "slack",
-  "_384"                  : "envelope-square",
-  "_385"                  : "wordpress",
-  "_386"                  : "openid",
-  "_387"                  : "university",
-  "_388"                  : "graduation-cap",
-  "_389"                  : "yahoo",
-  "uniF1A0"               : "google",              #f1a0
-  "f1a1"                  : "reddit",
-  "_392"                  : "reddit-square",
-  "_393"                  : "stumbleupon-circle",
-  "f1a4"                  : "stumbleupon",
-  "_395"                  : "delicious",
-  "_396"                  : "digg",
-  "_397"                  : "pied-piper-pp",       #f1a7
-  "_398"                  : "pied-piper-alt",      #f1a8
-  "_399"                  : "drupal",
-  "_400"                  : "joomla",
-  "f1ab"                  : "language",            #f1ab
-  "_402"                  : "fax",
-  "_403"                  : "building",
-  "_404"                  : "child",               #f1ae
-  "uniF1B1"               : "paw",                 #f1b0
-  "_406"                  : "spoon",               #f1b1
-  "_407"                  : "cube",                #f1b2
-  "_408"                  : "cubes",               #f1b3
-  "_409"                  : "behance",             #f1b4
-  "_410"                  : "behance-square",
-  "_411"                  : "steam",
-  "_412"                  : "steam-square",
-  "_413"                  : "recycle",
-  "_414"                  : "car",
-  "_415"                  : "taxi",
-  "_416"                  : "tree",
-  "_417"                  : "spotify",
-  "_418"                  : "deviantart",
-  "_419"                  : "soundcloud",
-  "uniF1C0"               : "database",            #f1c0
-  "uniF1C1"               : "file-pdf-o",          #f1c1
-  "_422"                  : "file-word-o",
-  "_423"                  : "file-excel-o",
-  "_424"                  : "file-powerpoint-o",
-  "_425"                  : "file-image-o",
-  "_426"                  : "file-archive-o",
-  "_427"                  : "file-audio-o",
-  "_428"                  : "file-video-o",
-  "_429"                  : "file-code-o",
-  "_430"                  : "vine",
-  "_431"                  : "codepen",
-  "_432"                  : "jsfiddle",
-  "_433"                  : "life-ring",
-  "_434"                  : "circle-o-notch",
-  "uniF1D0"               : "rebel",
-  "uniF1D1"               : "empire",
-  "uniF1D2"               : "git-square",
-  "_438"                  : "git",
-  "_439"                  : "hacker-news",
-  "uniF1D5"               : "tencent-weibo",
-  "uniF1D6"               : "qq",
-  "uniF1D7"               : "weixin",              #f1d7
-  "_443"                  : "paper-plane",
-  "_444"                  : "paper-plane-o",
-  "_445"                  : "history",             #f1da
-  "_446"                  : "circle-thin",
-  "_447"                  : "header",              #f1dc
-  "_448"                  : "paragraph",
-  "_449"                  : "sliders",
-  "uniF1E0"               : "share-alt",
-  "_451"                  : "share-alt-square",
-  "_452"                  : "bomb",
-  "_453"                  : "futbol-o",
-  "_454"                  : "tty",
-  "_455"                  : "binoculars",          #f1e5
-  "_456"                  : "plug",
-  "_457"                  : "slideshare",
-  "_458"                  : "twitch",              #f1e8
-  "_459"                  : "yelp",                #f1e9
-  "_460"                  : "newspaper-o",         #f1ea
-  "_461"                  : "wifi",
-  "_462"                  : "calculator",
-  "_463"                  : "paypal",
-  "_464"                  : "google-wallet",
-  "uniF1F0"               : "cc-visa",
-  "_466"                  : "cc-mastercard",
-  "_467"                  : "cc-discover",
-  "f1f3"                  : "cc-amex",
-  "_469"                  : "cc-paypal",
-  "_470"                  : "cc-stripe",
-  "_471"                  : "bell-slash",
-  "_472"                  : "bell-slash-o",
-  "_473"                  : "trash",
-  "_474"                  : "copyright",
-  "_475"                  : "at",
-  "_476"                  : "eyedropper",          #f1fb
-  "f1fc"                  : "paint-brush",
-  "_478"                  : "birthday-cake",
-  "_479"                  : "area-chart",
-  "_480"                  : "pie-chart",
-  "_481"                  : "line-chart",
-  "_482"                  : "lastfm",
-  "_483"                  : "lastfm-square",
-  "_484"                  : "toggle-off",
-  "_485"                  : "toggle-on",
-  "_486"                  : "bicycle",
-  "_487"                  : "bus",
-  "_488"                  : "ioxhost",
-  "_489"                  : "angellist",
-  "_490"                  : "cc",
-  "_491"                  : "ils",                 #f20b
-  "_492"                  : "meanpath",
-  "_493"                  : "buysellads",
-  "_494"                  : "connectdevelop",
-  "f210"                  : "dashcube",
-  "_496"                  : "forumbee",
-  "f212"                  : "leanpub",
-  "_498"                  : "sellsy",
-  "_499"                  : "shirtsinbulk",
-  "_500"                  : "simplybuilt",
-  "_501"                  : "skyatlas",
-  "_502"                  : "cart-plus",
-  "_503"                  : "cart-arrow-down",
-  "_504"                  : "diamond",
-  "_505"                  : "ship",
-  "_506"                  : "user-secret",
-  "_507"                  : "motorcycle",
-  "_508"                  : "street-view",
-  "_509"                  : "heartbeat",
-  "_511"                  : "mars",
-  "_512"                  : "mercury",
-  "_513"                  : "transgender",
-  "_514"                  : "transgender-alt",
-  "_515"                  : "venus-double",
-  "_516"                  : "mars-double",
-  "_517"                  : "venus-mars",
-  "_518"                  : "mars-stroke",
-  "_519"                  : "mars-stroke-v",
-  "_520"                  : "mars-stroke-h",
-  "_521"                  : "neuter",
-  "_522"                  : "genderless",          #f22d
   "_523"                  : ".notdef",             #f22e (blank)
   "_524"                  : ".notdef",             #f22f (blank)
-  "_525"                  : "facebook-official",   #f230
-  "_526"                  : "pinterest-p",
-  "_527"                  : "whatsapp",
-  "_528"                  : "server",
-  "_529"                  : "user-plus",
-  "_530"                  : "user-times",
-  "_531"                  : "bed",
-  "_532"                  : "viacoin",
-  "_533"                  : "train",
-  "_534"                  : "subway",
-  "_535"                  : "medium",              #f23a
-  "_536"                  : "y-combinator",        #f23b
-  "_537"                  : "optin-monster",
-  "_538"                  : "opencart",
-  "_539"                  : "expeditedssl",
-  "_540"                  : "battery-full",
-  "_541"                  : "battery-three-quarters",
-  "_542"                  : "battery-half",
-  "_543"                  : "battery-quarter",
-  "_544"                  : "battery-empty",
-  "_545"                  : "mouse-pointer",
-  "_546"                  : "i-cursor",
-  "_547"                  : "object-group",
-  "_548"                  : "object-ungroup",
-  "_549"                  : "sticky-note",
-  "_550"                  : "sticky-note-o",
-  "_551"                  : "cc-jcb",
-  "_552"                  : "cc-diners-club",
-  "_553"                  : "clone",
-  "_554"                  : "balance-scale",
-  "_555"                  : "hourglass-o",
-  "_556"                  : "hourglass-start",
-  "_557"                  : "hourglass-half",
-  "_558"                  : "hourglass-end",
-  "_559"                  : "hourglass",
-  "_560"                  : "hand-rock-o",
-  "_561"                  : "hand-paper-o",
-  "_562"                  : "hand-scissors-o",
-  "_563"                  : "hand-lizard-o",
-  "_564"                  : "hand-spock-o",
-  "_565"                  : "hand-pointer-o",
-  "_566"                  : "hand-peace-o",
-  "_567"                  : "trademark",
-  "_568"                  : "registered",
-  "_569"                  : "creative-commons",    #f25e
-  "f260"                  : "gg",
-  "f261"                  : "gg-circle",
-  "_572"                  : "tripadvisor",
-  "f263"                  : "odnoklassniki",
-  "_574"                  : "odnoklassniki-square",
-  "_575"                  : "get-pocket",
-  "_576"                  : "wikipedia-w",         #f266
-  "_577"                  : "safari",
-  "_578"                  : "chrome",
-  "_579"                  : "firefox",
-  "_580"                  : "opera",
-  "_581"                  : "internet-explorer",   #f26c
-  "_582"                  : "television",
-  "_583"                  : "contao",
-  "_584"                  : "500px",               #f26e
-  "_585"                  : "amazon",
-  "_586"                  : "calendar-plus-o",
-  "_587"                  : "calendar-minus-o",
-  "_588"                  : "calendar-times-o",
-  "_589"                  : "calendar-check-o",
-  "_590"                  : "industry",            #f275
-  "_591"                  : "map-pin",
-  "_592"                  : "map-signs",
-  "_593"                  : "map-o",
-  "_594"                  : "map",
-  "_595"                  : "commenting",
-  "_596"                  : "commenting-o",
-  "_597"                  : "houzz",
-  "_598"                  : "vimeo",
-  "f27e"                  : "black-tie",           #f27e
-  "uniF280"               : "fonticons",           #f280
-  "uniF281"               : "reddit-alien",        #f281
-  "_602"                  : "edge",                #f282
-  "_603"                  : "credit-card-alt",     #f283
-  "_604"                  : "codiepie",            #f284
-  "uniF285"               : "modx",                #f285
-  "uniF286"               : "fort-awesome",        #f286
-  "_607"                  : "usb",                 #f287
-  "_608"                  : "product-hunt",        #f288
-  "_609"                  : "mixcloud",            #f289
-  "_610"                  : "scribd",              #f28a
-  "_611"                  : "pause-circle",        #f28b
-  "_612"                  : "pause-circle-o",      #f28c
-  "_613"                  : "stop-circle",         #f28d
-  "_614"                  : "stop-circle-o",       #f28e
-  "_615"                  : "shopping-bag",        #f290
-  "_616"                  : "shopping-basket",     #f291
-  "_617"                  : "hashtag",             #f292
-  "_618"                  : "bluetooth",           #f293
-  "_619"                  : "bluetooth-b",         #f294
-  "_620"                  : "percent",             #f295
-  "_621"                  : "gitlab",              #f296
-  "_622"                  : "wpbeginner",          #f297
-  "_623"                  : "wpforms",             #f298
-  "_624"                  : "envira",              #f299
-  "_625"                  : "universal-access",    #f29a
-  "_626"                  : "wheelchair-alt",      #f29b
-  "_627"                  : "question-circle-o",   #f29c
-  "_628"                  : "blind",               #f29d
-  "_629"                  : "audio-description",   #f29e
-  "uniF2A0"               : "volume-control-phone",#f2a0
-  "uniF2A1"               : "braille",             #f2a1
-  "uniF2A2"               : "assistive-listening-systems",#f2a2
-  "uniF2A3"               : "american-sign-language-interpreting",#f2a3
-  "uniF2A4"               : "deaf",                #f2a4
-  "uniF2A5"               : "glide",               #f2a5
-  "uniF2A6"               : "glide-g",             #f2a6
-  "uniF2A7"               : "sign-language",       #f2a7
-  "uniF2A8"               : "low-vision",          #f2a8
-  "uniF2A9"               : "viadeo",              #f2a9
-  "uniF2AA"               : "viadeo-square",       #f2aa
-  "uniF2AB"               : "snapchat",            #f2ab
-  "uniF2AC"               : "snapchat-ghost",      #f2ac
-  "uniF2AD"               : "snapchat-square",     #f2ad
-  "uniF2AE"               : "pied-piper",          #f2ae
-  "uniF2B0"               : "first-order",         #f2b0
-  "uniF2B1"               : "yoast",               #f2b1
-  "uniF2B2"               : "themeisle",           #f2b2
-  "uniF2B3"               : "google-plus-official",#f2b3
-  "uniF2B4"               : "font-awesome",        #f2b4
   "uniF2B5"               : ".notdef",             #f2b5
   "uniF2B6"               : ".notdef",             #f2b6
   "uniF2B7"               : ".notdef",             #f2b7
@@ -483,35 +89,894 @@ tex_macro_names_replace = {
 };
 
 
+# ==============================================================================
+# opentype font reader
+# ==============================================================================
+# read the version, units per em, glyph names and unicode mapping straight from
+# the font tables (head, name, cmap, post and the CFF charset)
+# ------------------------------------------------------------------------------
+# CFF standard strings (SIDs 0 to 390), cfr Adobe technical note #5176, appendix A
+CFF_STANDARD_STRINGS = """\
+.notdef space exclam quotedbl numbersign dollar percent ampersand quoteright
+parenleft parenright asterisk plus comma hyphen period slash zero one two three
+four five six seven eight nine colon semicolon less equal greater question at A
+B C D E F G H I J K L M N O P Q R S T U V W X Y Z bracketleft backslash
+bracketright asciicircum underscore quoteleft a b c d e f g h i j k l m n o p q r
+s t u v w x y z braceleft bar braceright asciitilde exclamdown cent sterling
+fraction yen florin section currency quotesingle quotedblleft guillemotleft
+guilsinglleft guilsinglright fi fl endash dagger daggerdbl periodcentered
+paragraph bullet quotesinglbase quotedblbase quotedblright guillemotright
+ellipsis perthousand questiondown grave acute circumflex tilde macron breve
+dotaccent dieresis ring cedilla hungarumlaut ogonek caron emdash AE ordfeminine
+Lslash Oslash OE ordmasculine ae dotlessi lslash oslash oe germandbls
+onesuperior logicalnot mu trademark Eth onehalf plusminus Thorn onequarter
+divide brokenbar degree thorn threequarters twosuperior registered minus eth
+multiply threesuperior copyright Aacute Acircumflex Adieresis Agrave Aring
+Atilde Ccedilla Eacute Ecircumflex Edieresis Egrave Iacute Icircumflex
+Idieresis Igrave Ntilde Oacute Ocircumflex Odieresis Ograve Otilde Scaron
+Uacute Ucircumflex Udieresis Ugrave Yacute Ydieresis Zcaron aacute acircumflex
+adieresis agrave aring atilde ccedilla eacute ecircumflex edieresis egrave
+iacute icircumflex idieresis igrave ntilde oacute ocircumflex odieresis ograve
+otilde scaron uacute ucircumflex udieresis ugrave yacute ydieresis zcaron
+exclamsmall Hungarumlautsmall dollaroldstyle dollarsuperior ampersandsmall
+Acutesmall parenleftsuperior parenrightsuperior twodotenleader onedotenleader
+zerooldstyle oneoldstyle twooldstyle threeoldstyle fouroldstyle fiveoldstyle
+sixoldstyle sevenoldstyle eightoldstyle nineoldstyle commasuperior
+threequartersemdash periodsuperior questionsmall asuperior bsuperior
+centsuperior dsuperior esuperior isuperior lsuperior msuperior nsuperior
+osuperior rsuperior ssuperior tsuperior ff ffi ffl parenleftinferior
+parenrightinferior Circumflexsmall hyphensuperior Gravesmall Asmall Bsmall
+Csmall Dsmall Esmall Fsmall Gsmall Hsmall Ismall Jsmall Ksmall Lsmall Msmall
+Nsmall Osmall Psmall Qsmall Rsmall Ssmall Tsmall Usmall Vsmall Wsmall Xsmall
+Ysmall Zsmall colonmonetary onefitted rupiah Tildesmall exclamdownsmall
+centoldstyle Lslashsmall Scaronsmall Zcaronsmall Dieresissmall Brevesmall
+Caronsmall Dotaccentsmall Macronsmall figuredash hypheninferior Ogoneksmall
+Ringsmall Cedillasmall questiondownsmall oneeighth threeeighths fiveeighths
+seveneighths onethird twothirds zerosuperior foursuperior fivesuperior
+sixsuperior sevensuperior eightsuperior ninesuperior zeroinferior oneinferior
+twoinferior threeinferior fourinferior fiveinferior sixinferior seveninferior
+eightinferior nineinferior centinferior dollarinferior periodinferior
+commainferior Agravesmall Aacutesmall Acircumflexsmall Atildesmall
+Adieresissmall Aringsmall AEsmall Ccedillasmall Egravesmall Eacutesmall
+Ecircumflexsmall Edieresissmall Igravesmall Iacutesmall Icircumflexsmall
+Idieresissmall Ethsmall Ntildesmall Ogravesmall Oacutesmall Ocircumflexsmall
+Otildesmall Odieresissmall OEsmall Oslashsmall Ugravesmall Uacutesmall
+Ucircumflexsmall Udieresissmall Yacutesmall Thornsmall Ydieresissmall 001.000
+001.001 001.002 001.003 Black Bold Book Light Medium Regular Roman Semibold
+""".split();
+
+# standard macintosh glyph order, used by version 2.0 post tables
+MAC_GLYPH_NAMES = """\
+.notdef .null nonmarkingreturn space exclam quotedbl numbersign dollar percent
+ampersand quotesingle parenleft parenright asterisk plus comma hyphen period
+slash zero one two three four five six seven eight nine colon semicolon less
+equal greater question at A B C D E F G H I J K L M N O P Q R S T U V W X Y Z
+bracketleft backslash bracketright asciicircum underscore grave a b c d e f g h
+i j k l m n o p q r s t u v w x y z braceleft bar braceright asciitilde
+Adieresis Aring Ccedilla Eacute Ntilde Odieresis Udieresis aacute agrave
+acircumflex adieresis atilde aring ccedilla eacute egrave ecircumflex edieresis
+iacute igrave icircumflex idieresis ntilde oacute ograve ocircumflex odieresis
+otilde uacute ugrave ucircumflex udieresis dagger degree cent sterling section
+bullet paragraph germandbls registered copyright trademark acute dieresis
+notequal AE Oslash infinity plusminus lessequal greaterequal yen mu partialdiff
+summation product pi integral ordfeminine ordmasculine Omega ae oslash
+questiondown exclamdown logicalnot radical florin approxequal Delta
+guillemotleft guillemotright ellipsis nonbreakingspace Agrave Atilde Otilde OE
+oe endash emdash quotedblleft quotedblright quoteleft quoteright divide lozenge
+ydieresis Ydieresis fraction currency guilsinglleft guilsinglright fi fl
+daggerdbl periodcentered quotesinglbase quotedblbase perthousand Acircumflex
+Ecircumflex Aacute Edieresis Egrave Iacute Icircumflex Idieresis Igrave Oacute
+Ocircumflex apple Ograve Uacute Ucircumflex Ugrave dotlessi circumflex tilde
+macron breve dotaccent ring cedilla hungarumlaut ogonek caron Lslash lslash
+Scaron scaron Zcaron zcaron brokenbar Eth eth Yacute yacute Thorn thorn minus
+multiply onesuperior twosuperior threesuperior onehalf onequarter threequarters
+franc Gbreve gbreve Idotaccent Scedilla scedilla Cacute cacute Ccaron ccaron
+dcroat
+""".split();
+
+def otf_tables(data):
+  sfnt_version, num_tables = struct.unpack_from('>4sH', data, 0);
+  if sfnt_version not in (b'OTTO', b'\x00\x01\x00\x00', b'true'):
+    raise ValueError("not an OpenType font");
+  tables = {};
+  for i in range(num_tables):
+    tag, checksum, offset, length = struct.unpack_from('>4sIII', data, 12 + 16*i);
+    tables[tag.decode('latin-1')] = offset;
+  return tables;
+
+def otf_name(data, offset, name_id):
+  format, count, string_offset = struct.unpack_from('>HHH', data, offset);
+  names = {};
+  for i in range(count):
+    platform_id, encoding_id, language_id, record_name_id, length, record_offset = struct.unpack_from('>HHHHHH', data, offset + 6 + 12*i);
+    if record_name_id == name_id:
+      string = bytes(data[offset + string_offset + record_offset:offset + string_offset + record_offset + length]);
+      if platform_id in (0, 3):
+        names[platform_id, language_id] = string.decode('utf-16-be');
+      elif platform_id == 1:
+        names[platform_id, language_id] = string.decode('latin-1');
+  # prefer the windows english name
+  for key in [(3, 0x409), (1, 0)] + sorted(names):
+    if key in names:
+      return names[key];
+  return None;
+
+def otf_cmap(data, offset):
+  version, num_subtables = struct.unpack_from('>HH', data, offset);
+  subtables = {};
+  for i in range(num_subtables):
+    platform_id, encoding_id, subtable_offset = struct.unpack_from('>HHI', data, offset + 4 + 8*i);
+    subtables[platform_id, encoding_id] = offset + subtable_offset;
+  cmap = {};
+  for key in [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0), (3, 0)]:
+    if key not in subtables:
+      continue;
+    subtable = subtables[key];
+    format = struct.unpack_from('>H', data, subtable)[0];
+    if format == 4:
+      seg_count = struct.unpack_from('>H', data, subtable + 6)[0] // 2;
+      end_codes = struct.unpack_from('>{}H'.format(seg_count), data, subtable + 14);
+      start_codes = struct.unpack_from('>{}H'.format(seg_count), data, subtable + 16 + 2*seg_count);
+      id_deltas = struct.unpack_from('>{}h'.format(seg_count), data, subtable + 16 + 4*seg_count);
+      id_range_offsets_start = subtable + 16 + 6*seg_count;
+      id_range_offsets = struct.unpack_from('>{}H'.format(seg_count), data, id_range_offsets_start);
+      for segment in range(seg_count):
+        for codepoint in range(start_codes[segment], end_codes[segment] + 1):
+          if codepoint == 0xFFFF:
+            continue;
+          if id_range_offsets[segment] == 0:
+            glyph_id = (codepoint + id_deltas[segment]) & 0xFFFF;
+          else:
+            glyph_offset = id_range_offsets_start + 2*segment + id_range_offsets[segment] + 2*(codepoint - start_codes[segment]);
+            glyph_id = struct.unpack_from('>H', data, glyph_offset)[0];
+            if glyph_id != 0:
+              glyph_id = (glyph_id + id_deltas[segment]) & 0xFFFF;
+          if glyph_id != 0:
+            cmap[codepoint] = glyph_id;
+    elif format == 12:
+      num_groups = struct.unpack_from('>I', data, subtable + 12)[0];
+      for group in range(num_groups):
+        start_code, end_code, start_glyph_id = struct.unpack_from('>III', data, subtable + 16 + 12*group);
+        for codepoint in range(start_code, end_code + 1):
+          cmap[codepoint] = start_glyph_id + codepoint - start_code;
+    elif format == 0:
+      for codepoint, glyph_id in enumerate(struct.unpack_from('>256B', data, subtable + 6)):
+        if glyph_id != 0:
+          cmap[codepoint] = glyph_id;
+    else:
+      continue;
+    return cmap;
+  return cmap;
+
+def otf_post_glyph_names(data, offset, num_glyphs):
+  version = struct.unpack_from('>I', data, offset)[0];
+  if version == 0x00010000:
+    return MAC_GLYPH_NAMES[:num_glyphs];
+  if version != 0x00020000:
+    return None; # version 3.0 tables don't store glyph names
+  count = struct.unpack_from('>H', data, offset + 32)[0];
+  indices = struct.unpack_from('>{}H'.format(count), data, offset + 34);
+  strings = [];
+  position = offset + 34 + 2*count;
+  while len(strings) < max([index - 257 for index in indices] + [0]):
+    length = data[position];
+    strings.append(bytes(data[position + 1:position + 1 + length]).decode('latin-1'));
+    position += 1 + length;
+  return [MAC_GLYPH_NAMES[index] if index < 258 else strings[index - 258] for index in indices];
+
+def cff_index(data, offset):
+  count = struct.unpack_from('>H', data, offset)[0];
+  if count == 0:
+    return [], offset + 2;
+  off_size = data[offset + 2];
+  offsets = [int.from_bytes(data[offset + 3 + i*off_size:offset + 3 + (i+1)*off_size], 'big') for i in range(count + 1)];
+  base = offset + 2 + (count + 1) * off_size; # offsets are relative to the byte preceding the data
+  return [(base + offsets[i], base + offsets[i+1]) for i in range(count)], base + offsets[-1];
+
+def cff_dict(data, start, end):
+  entries = {};
+  operands = [];
+  position = start;
+  while position < end:
+    b0 = data[position];
+    if b0 <= 21:
+      if b0 == 12:
+        b0 = 1200 + data[position + 1];
+        position += 1;
+      entries[b0] = operands;
+      operands = [];
+      position += 1;
+    elif b0 == 28:
+      operands.append(struct.unpack_from('>h', data, position + 1)[0]);
+      position += 3;
+    elif b0 == 29:
+      operands.append(struct.unpack_from('>i', data, position + 1)[0]);
+      position += 5;
+    elif b0 == 30:
+      nibbles = [];
+      position += 1;
+      while 0xf not in nibbles:
+        nibbles += [data[position] >> 4, data[position] & 0xf];
+        position += 1;
+      real = ''.join(['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '.', 'E', 'E-', '', '-'][nibble] for nibble in nibbles[:nibbles.index(0xf)]);
+      operands.append(float(real));
+    elif b0 <= 246:
+      operands.append(b0 - 139);
+      position += 1;
+    elif b0 <= 250:
+      operands.append((b0 - 247) * 256 + data[position + 1] + 108);
+      position += 2;
+    elif b0 <= 254:
+      operands.append(-(b0 - 251) * 256 - data[position + 1] - 108);
+      position += 2;
+    else:
+      raise ValueError("invalid CFF dict operand");
+  return entries;
+
+def cff_glyph_names(data, offset):
+  header_size = data[offset + 2];
+  names, position = cff_index(data, offset + header_size);
+  top_dicts, position = cff_index(data, position);
+  strings, position = cff_index(data, position);
+  top_dict = cff_dict(data, *top_dicts[0]);
+  charstrings, _ = cff_index(data, offset + top_dict[17][0]);
+  num_glyphs = len(charstrings);
+  charset = top_dict.get(15, [0])[0];
+  if charset == 0: # predefined ISOAdobe charset
+    sids = list(range(num_glyphs));
+  elif charset in (1, 2):
+    raise ValueError("predefined expert charsets are not supported");
+  else:
+    position = offset + charset;
+    format = data[position];
+    position += 1;
+    sids = [0];
+    while len(sids) < num_glyphs:
+      if format == 0:
+        sids.append(struct.unpack_from('>H', data, position)[0]);
+        position += 2;
+      else:
+        first = struct.unpack_from('>H', data, position)[0];
+        if format == 1:
+          left = data[position + 2];
+          position += 3;
+        else:
+          left = struct.unpack_from('>H', data, position + 2)[0];
+          position += 4;
+        sids.extend(range(first, first + left + 1));
+    sids = sids[:num_glyphs];
+  return [CFF_STANDARD_STRINGS[sid] if sid < len(CFF_STANDARD_STRINGS) else bytes(data[slice(*strings[sid - len(CFF_STANDARD_STRINGS)])]).decode('latin-1') for sid in sids];
+
+# advance widths of all the glyphs, from the hmtx table
+def otf_advance_widths(data, tables, num_glyphs):
+  num_metrics = struct.unpack_from('>H', data, tables['hhea'] + 34)[0];
+  widths = [struct.unpack_from('>H', data, tables['hmtx'] + 4*i)[0] for i in range(num_metrics)];
+  return widths + widths[-1:] * (num_glyphs - num_metrics); # monospaced tail
+
+# bounding box of a cubic bezier curve along one axis, from its end points and
+# the extrema found where its derivative vanishes
+def bezier_bounds(p0, p1, p2, p3):
+  low, high = (p0, p3) if p0 <= p3 else (p3, p0);
+  if low <= p1 <= high and low <= p2 <= high: # no extremum within the curve
+    return low, high;
+  a, b, c = -p0 + 3*p1 - 3*p2 + p3, 2*(p0 - 2*p1 + p2), p1 - p0;
+  if abs(a) < 1e-12:
+    roots = [-c / b] if abs(b) > 1e-12 else [];
+  else:
+    delta = b*b - 4*a*c;
+    roots = [(-b + sign * delta**0.5) / (2*a) for sign in (1, -1)] if delta >= 0 else [];
+  values = [p0, p3] + [(1-t)**3*p0 + 3*(1-t)**2*t*p1 + 3*(1-t)*t**2*p2 + t**3*p3 for t in roots if 0 < t < 1];
+  return min(values), max(values);
+
+# bounding boxes of all the glyphs, running their type 2 charstrings (cfr Adobe
+# technical note #5177); None for empty glyphs
+def cff_bounding_boxes(data, offset):
+  header_size = data[offset + 2];
+  names, position = cff_index(data, offset + header_size);
+  top_dicts, position = cff_index(data, position);
+  strings, position = cff_index(data, position);
+  global_subrs, position = cff_index(data, position);
+  top_dict = cff_dict(data, *top_dicts[0]);
+  charstrings, _ = cff_index(data, offset + top_dict[17][0]);
+  private_size, private_offset = top_dict.get(18, [0, 0]);
+  private_dict = cff_dict(data, offset + private_offset, offset + private_offset + private_size);
+  local_subrs = cff_index(data, offset + private_offset + private_dict[19][0])[0] if 19 in private_dict else [];
+  bias = lambda subrs: 107 if len(subrs) < 1240 else 1131 if len(subrs) < 33900 else 32768;
+
+  def run(start, end, state):
+    stack = state['stack'];
+    position = start;
+    while position < end:
+      b0 = data[position];
+      position += 1;
+      if b0 >= 32 or b0 == 28:
+        if b0 == 28:
+          stack.append(struct.unpack_from('>h', data, position)[0]);
+          position += 2;
+        elif b0 <= 246:
+          stack.append(b0 - 139);
+        elif b0 <= 250:
+          stack.append((b0 - 247) * 256 + data[position] + 108);
+          position += 1;
+        elif b0 <= 254:
+          stack.append(-(b0 - 251) * 256 - data[position] - 108);
+          position += 1;
+        else:
+          stack.append(struct.unpack_from('>i', data, position)[0] / 65536);
+          position += 4;
+        continue;
+      if b0 in (1, 3, 18, 23): # stems
+        state['stems'] += len(stack) // 2;
+        stack.clear();
+      elif b0 in (19, 20): # hintmask, cntrmask, with implied vstems
+        state['stems'] += len(stack) // 2;
+        stack.clear();
+        position += (state['stems'] + 7) // 8;
+      elif b0 in (10, 29): # callsubr, callgsubr
+        subrs = local_subrs if b0 == 10 else global_subrs;
+        subr = subrs[stack.pop() + bias(subrs)];
+        if run(subr[0], subr[1], state):
+          return True;
+      elif b0 == 11: # return
+        return False;
+      elif b0 == 14: # endchar
+        return True;
+      elif b0 == 12: # escaped operators, of which only the flex ones draw
+        flex(data[position], stack, state);
+        position += 1;
+        stack.clear();
+      elif b0 in (21, 22, 4): # moveto
+        args = stack[-2:] if b0 == 21 else [stack[-1], 0] if b0 == 22 else [0, stack[-1]];
+        state['point'] = (state['point'][0] + args[0], state['point'][1] + args[1]);
+        state['points'].append(state['point']);
+        stack.clear();
+      else:
+        path(b0, stack, state);
+        stack.clear();
+    return False;
+
+  def line(state, dx, dy):
+    state['point'] = (state['point'][0] + dx, state['point'][1] + dy);
+    state['points'].append(state['point']);
+  def curve(state, dxa, dya, dxb, dyb, dxc, dyc):
+    x0, y0 = state['point'];
+    x1, y1 = x0 + dxa, y0 + dya;
+    x2, y2 = x1 + dxb, y1 + dyb;
+    x3, y3 = x2 + dxc, y2 + dyc;
+    state['curves'].append((bezier_bounds(x0, x1, x2, x3), bezier_bounds(y0, y1, y2, y3)));
+    state['point'] = (x3, y3);
+    state['points'].append(state['point']);
+
+  def path(operator, args, state):
+    if operator == 5: # rlineto
+      for i in range(0, len(args) - 1, 2):
+        line(state, args[i], args[i+1]);
+    elif operator in (6, 7): # hlineto, vlineto
+      horizontal = operator == 6;
+      for arg in args:
+        line(state, arg, 0) if horizontal else line(state, 0, arg);
+        horizontal = not horizontal;
+    elif operator == 8: # rrcurveto
+      for i in range(0, len(args) - 5, 6):
+        curve(state, *args[i:i+6]);
+    elif operator == 24: # rcurveline
+      for i in range(0, len(args) - 2, 6):
+        curve(state, *args[i:i+6]);
+      line(state, *args[-2:]);
+    elif operator == 25: # rlinecurve
+      for i in range(0, len(args) - 6, 2):
+        line(state, args[i], args[i+1]);
+      curve(state, *args[-6:]);
+    elif operator in (26, 27): # vvcurveto, hhcurveto
+      first = args[0] if len(args) % 4 else 0;
+      args = args[len(args) % 4:];
+      for i in range(0, len(args), 4):
+        a, b, c, d = args[i:i+4];
+        if operator == 26:
+          curve(state, first if i == 0 else 0, a, b, c, 0, d);
+        else:
+          curve(state, a, first if i == 0 else 0, b, c, d, 0);
+    elif operator in (30, 31): # vhcurveto, hvcurveto
+      horizontal = operator == 31;
+      last = args[-1] if len(args) % 4 else 0;
+      args = args[:len(args) - len(args) % 4];
+      for i in range(0, len(args), 4):
+        a, b, c, d = args[i:i+4];
+        extra = last if i + 4 == len(args) else 0;
+        if horizontal:
+          curve(state, a, 0, b, c, extra, d);
+        else:
+          curve(state, 0, a, b, c, d, extra);
+        horizontal = not horizontal;
+
+  # flex curves, drawn as their two halves
+  def flex(operator, args, state):
+    if operator == 35: # flex
+      curve(state, *args[0:6]);
+      curve(state, *args[6:12]);
+    elif operator == 34: # hflex
+      dx1, dx2, dy2, dx3, dx4, dx5, dx6 = args[:7];
+      curve(state, dx1, 0, dx2, dy2, dx3, 0);
+      curve(state, dx4, 0, dx5, -dy2, dx6, 0);
+    elif operator == 36: # hflex1
+      dx1, dy1, dx2, dy2, dx3, dx4, dx5, dy5, dx6 = args[:9];
+      curve(state, dx1, dy1, dx2, dy2, dx3, 0);
+      curve(state, dx4, 0, dx5, dy5, dx6, -(dy1 + dy2 + dy5));
+    elif operator == 37: # flex1
+      dx = sum(args[0:10:2]);
+      dy = sum(args[1:10:2]);
+      curve(state, *args[0:6]);
+      if abs(dx) > abs(dy):
+        curve(state, *(args[6:10] + [args[10], -dy]));
+      else:
+        curve(state, *(args[6:10] + [-dx, args[10]]));
+
+  boxes = [];
+  for start, end in charstrings:
+    state = {'stack': [], 'stems': 0, 'point': (0, 0), 'points': [], 'curves': []};
+    run(start, end, state);
+    if len(state['points']) <= 1 and not state['curves']:
+      boxes.append(None);
+      continue;
+    xs = [x for x, y in state['points']] + [value for curve in state['curves'] for value in curve[0]];
+    ys = [y for x, y in state['points']] + [value for curve in state['curves'] for value in curve[1]];
+    boxes.append((min(xs), min(ys), max(xs), max(ys)));
+  return boxes;
+
+def read_otf(path):
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+    tables = otf_tables(data);
+    units_per_em = struct.unpack_from('>H', data, tables['head'] + 18)[0];
+    num_glyphs = struct.unpack_from('>H', data, tables['maxp'] + 4)[0];
+    version = otf_name(data, tables['name'], 5) if 'name' in tables else None; # e.g. "Version 4.6.3 2016"
+    match = re.match(r"(?:Version\s+)?([0-9][0-9.]*)", version or '');
+    if match:
+      version = match.group(1);
+    else:
+      revision = struct.unpack_from('>i', data, tables['head'] + 4)[0];
+      version = '{:.3f}'.format(revision / 65536).rstrip('0').rstrip('.');
+    glyph_names = otf_post_glyph_names(data, tables['post'], num_glyphs) if 'post' in tables else None;
+    if glyph_names is None and 'CFF ' in tables:
+      glyph_names = cff_glyph_names(data, tables['CFF ']);
+    if glyph_names is None:
+      glyph_names = ['glyph{:05d}'.format(glyph_id) for glyph_id in range(num_glyphs)];
+    cmap = {codepoint: glyph_names[glyph_id] for codepoint, glyph_id in otf_cmap(data, tables['cmap']).items() if glyph_id < len(glyph_names)} if 'cmap' in tables else {};
+    modified = struct.unpack_from('>q', data, tables['head'] + 28)[0]; # seconds since 1904
+    ps_name = otf_name(data, tables['name'], 6) if 'name' in tables else None;
+    italic_angle = struct.unpack_from('>i', data, tables['post'] + 4)[0] / 65536 if 'post' in tables else 0;
+    x_height = struct.unpack_from('>h', data, tables['OS/2'] + 86)[0] if 'OS/2' in tables and struct.unpack_from('>H', data, tables['OS/2'])[0] >= 2 else 0;
+  date = (datetime.datetime(1904, 1, 1) + datetime.timedelta(seconds=modified)).date();
+  return {'version': version, 'units_per_em': units_per_em, 'glyph_names': glyph_names, 'cmap': cmap, 'date': date,
+    'ps_name': ps_name, 'italic_angle': italic_angle, 'x_height': x_height};
+
+# advance width and bounding box of every glyph, by glyph name, in one pass over
+# the font; the bounding box is None for empty glyphs
+def read_otf_metrics(path, glyph_names):
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+    tables = otf_tables(data);
+    widths = otf_advance_widths(data, tables, len(glyph_names));
+    boxes = cff_bounding_boxes(data, tables['CFF ']) if 'CFF ' in tables else [None] * len(glyph_names);
+  return dict(zip(glyph_names, zip(widths, boxes)));
+
+
+# output files
+# ------------------------------------------------------------------------------
+# a new file next to path, moved into place once complete; unlike the ones of
+# tempfile, it gets the permissions of any new file (0o666 less the umask)
+def output_tempfile(path):
+  while True:
+    try:
+      return open(os.path.join(os.path.dirname(path) or '.', '.{}.{}'.format(os.path.basename(path), os.urandom(4).hex())), 'xb');
+    except FileExistsError:
+      pass;
+
+# every output is rendered in memory and compared with the file on disk, which is
+# only replaced, atomically, when its content changed; unchanged outputs keep
+# their mtime, and don't trigger rebuilds of the documents depending on them
+def write_output(path, content):
+  content = content.encode('utf-8') if isinstance(content, str) else content;
+  if archive is not None and tds_path(path):
+    return archive_output(path, content);
+  try:
+    with open(path, 'rb') as f:
+      if f.read() == content:
+        return path;
+  except OSError:
+    pass;
+  with output_tempfile(path) as f:
+    f.write(content);
+  os.replace(f.name, path);
+  return path;
+
+# same for files produced by other tools in a temporary directory
+def move_output(source, path):
+  with open(source, 'rb') as f:
+    write_output(path, f.read());
+  os.remove(source);
+  return path;
+
+# the date stamped into the outputs, so that the same inputs always give the
+# same bytes: SOURCE_DATE_EPOCH when set (cfr
+# https://reproducible-builds.org/specs/source-date-epoch/), or else the date the
+# font was last modified
+def build_date(font):
+  if os.environ.get('SOURCE_DATE_EPOCH'):
+    try:
+      return datetime.datetime.fromtimestamp(int(os.environ['SOURCE_DATE_EPOCH']), datetime.timezone.utc).date();
+    except (ValueError, OverflowError):
+      raise GenerateError("[Error] SOURCE_DATE_EPOCH is not a unix timestamp: {}".format(os.environ['SOURCE_DATE_EPOCH']));
+  return read_otf(font)['date'];
+
+# tds archive
+# ------------------------------------------------------------------------------
+# with --archive, the package files are streamed into a zip or tar laid out as a
+# TDS tree as they are generated, instead of being written to the output
+# directory, which only gets the build cache, logs and report; entries are
+# stamped with the build date, so that the archive is reproducible as well
+TDS = [
+  (r"\.tfm$", 'fonts/tfm/public/fontawesome'),
+  (r"\.enc$", 'fonts/enc/pdftex/public/fontawesome'),
+  (r"\.pfb$", 'fonts/type1/public/fontawesome'),
+  (r"\.otf$", 'fonts/opentype/public/fontawesome'),
+  (r"\.map$", 'fonts/map/dvips/fontawesome'),
+  (r"^fontawesome\.tex$|^fontawesome-(catalog|metrics).*\.json$", 'doc/latex/fontawesome'),
+  (r"\.(sty|fd|tex|lua)$", 'tex/latex/fontawesome'),
+];
+ARCHIVE_FORMATS = {'.zip': 'zip', '.tar': 'w', '.tar.gz': 'gz', '.tgz': 'gz', '.tar.bz2': 'w:bz2', '.tar.xz': 'w:xz'};
+archive = None;
+archive_file = None;
+archive_time = None;
+archived = {}; # output path => size
+
+def archive_format(path):
+  for extension, mode in ARCHIVE_FORMATS.items():
+    if path.endswith(extension):
+      return mode;
+  raise argparse.ArgumentTypeError("expected a .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz file, got {}".format(path));
+
+# the path of an output in the tds tree, or None for the files kept out of it
+def tds_path(path):
+  if os.path.isabs(path):
+    return None;
+  filename = os.path.basename(path);
+  for pattern, directory in TDS:
+    if re.search(pattern, filename):
+      return directory + '/' + filename;
+  return None;
+
+def open_archive(path, date):
+  global archive, archive_file, archive_time;
+  mode = archive_format(path);
+  archive_time = datetime.datetime(date.year, date.month, date.day, tzinfo=datetime.timezone.utc);
+  archive_file = output_tempfile(path);
+  if mode == 'zip':
+    archive = zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED);
+  elif mode == 'gz':
+    # gzip stamps its own header with the current time otherwise
+    archive = tarfile.open(fileobj=gzip.GzipFile(fileobj=archive_file, mode='wb', filename='', mtime=archive_time.timestamp()), mode='w', format=tarfile.USTAR_FORMAT);
+  else:
+    archive = tarfile.open(fileobj=archive_file, mode=mode, format=tarfile.USTAR_FORMAT);
+  archived.clear();
+
+# every subfont run produces the same pfb, which is archived once
+def archive_output(path, content):
+  name = tds_path(path);
+  if os.path.normpath(path) not in archived:
+    if isinstance(archive, zipfile.ZipFile):
+      entry = zipfile.ZipInfo(name, archive_time.timetuple()[:6]);
+      entry.compress_type = zipfile.ZIP_DEFLATED;
+      entry.external_attr = 0o644 << 16;
+      archive.writestr(entry, content);
+    else:
+      entry = tarfile.TarInfo(name);
+      entry.size, entry.mtime, entry.mode = len(content), int(archive_time.timestamp()), 0o644;
+      archive.addfile(entry, io.BytesIO(content));
+    archived[os.path.normpath(path)] = len(content);
+  return path;
+
+# replace the archive once complete, or drop it when the build failed
+def close_archive(path, complete=True):
+  global archive;
+  if archive is None:
+    return;
+  fileobj = archive.fileobj if isinstance(archive, tarfile.TarFile) else None;
+  archive.close();
+  if isinstance(fileobj, gzip.GzipFile):
+    fileobj.close();
+  archive_file.close();
+  archive = None;
+  if complete:
+    os.replace(archive_file.name, path);
+  else:
+    os.remove(archive_file.name);
+
+
+# build cache
+# ------------------------------------------------------------------------------
+# each stage is skipped when the hash of its inputs matches the one recorded in
+# the cache during the last run, and all its output files are still present
+def file_digest(path):
+  sha = hashlib.sha256();
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 16), b''):
+      sha.update(chunk);
+  return sha.hexdigest();
+
+def digest(*parts):
+  sha = hashlib.sha256();
+  for part in parts:
+    sha.update(repr(part).encode('utf-8'));
+    sha.update(b'\0');
+  return sha.hexdigest();
+
+def load_cache():
+  try:
+    with open(CACHE, 'r') as f:
+      cache = json.load(f);
+    if cache.get('format') == CACHE_FORMAT:
+      return cache;
+  except (OSError, ValueError):
+    pass;
+  return {'format': CACHE_FORMAT, 'stages': {}};
+
+cache = {'format': CACHE_FORMAT, 'stages': {}};
+
+def save_cache():
+  write_output(CACHE, json.dumps(cache, indent=1, sort_keys=True));
+
+def stage_uptodate(stage, key):
+  entry = cache['stages'].get(stage);
+  return not args.force and archive is None and entry is not None and entry['key'] == key and all(os.path.isfile(output) for output in entry['outputs']);
+
+def stage_record(stage, key, outputs, **data):
+  cache['stages'][stage] = dict(data, key=key, outputs=outputs);
+  save_cache();
+  entry = report['stages'].setdefault(stage, {});
+  entry['status'] = 'built';
+  entry['outputs'] = len(outputs);
+  entry['bytes'] = sum(archived[os.path.normpath(output)] if os.path.normpath(output) in archived else os.path.getsize(output) for output in outputs);
+
+# run report
+# ------------------------------------------------------------------------------
+# each stage records its wall and cpu times, the peak memory allocated while it
+# ran, the durations of the commands it ran and the size of its outputs, into a
+# json report meant for tracking the generator cost over time
+report = {'stages': {}};
+subprocesses = [];
+
+def run_command(command, **kwargs):
+  start = time.perf_counter();
+  try:
+    return subprocess.run(command, **kwargs);
+  finally:
+    subprocesses.append({'command': ' '.join(command), 'wall': time.perf_counter() - start});
+
+@contextlib.contextmanager
+def timed_stage(stage):
+  entry = report['stages'].setdefault(stage, {'status': 'up to date'});
+  first_subprocess = len(subprocesses);
+  if tracemalloc.is_tracing():
+    tracemalloc.reset_peak();
+  profile = cProfile.Profile() if args.profile else None;
+  children = resource.getrusage(resource.RUSAGE_CHILDREN);
+  wall, cpu = time.perf_counter(), time.process_time();
+  if profile:
+    profile.enable();
+  try:
+    yield entry;
+  finally:
+    if profile:
+      profile.disable();
+      os.makedirs(args.profile, exist_ok=True);
+      profile.dump_stats(os.path.join(args.profile, '{}.prof'.format(stage)));
+    entry['wall'] = time.perf_counter() - wall;
+    entry['cpu'] = time.process_time() - cpu;
+    entry['children_cpu'] = sum(resource.getrusage(resource.RUSAGE_CHILDREN)[:2]) - sum(children[:2]);
+    if tracemalloc.is_tracing():
+      entry['peak_memory'] = tracemalloc.get_traced_memory()[1];
+    entry['subprocesses'] = subprocesses[first_subprocess:];
+
+def finish_report():
+  stages = report['stages'].values();
+  report['wall'] = time.perf_counter() - report.pop('start');
+  report['counts']['bytes_written'] = sum(stage.get('bytes', 0) for stage in stages);
+  report['counts']['subprocesses'] = sum(len(stage.get('subprocesses', [])) for stage in stages);
+
+def write_report(path):
+  write_output(path, json.dumps(report, indent=1));
+
+# read a usage histogram, either as a json object or as `name count' lines
+def read_usage(path):
+  with open(path, 'r') as f:
+    text = f.read();
+  if text.lstrip().startswith('{'):
+    return dict((name, int(count)) for name, count in json.loads(text).items());
+  usage = {};
+  for line in text.splitlines():
+    fields = line.split('%')[0].split();
+    if fields:
+      usage[fields[0]] = usage.get(fields[0], 0) + (int(fields[1]) if len(fields) > 1 else 1);
+  return usage;
+
+
 # command line arguments handling
 # ------------------------------------------------------------------------------
+# named styles, given as NAME=FONT:CSS (see the styles section below)
+STYLE_NAME = re.compile(r"^[a-z]+$"); # part of control sequence names
+NUMBER_WORDS = SMALL_NUMBERS[1:] + TENS[2:] + ['hundred', 'thousand', 'million', 'billion'];
+
+# whether name could be the start of a subfont number, such as twenty for
+# twentyone or onehundredt for onehundredtwo
+def number_prefix(name):
+  return not name or any(word.startswith(name) or (name.startswith(word) and number_prefix(name[len(word):])) for word in NUMBER_WORDS);
+
+# style names are followed by the subfont numbers in the pdftex font names, so
+# that a style named twenty would give \FAtwentyone, the subfont of the default
+# style; subset is taken by the subset font
+def valid_style_name(name):
+  return bool(STYLE_NAME.match(name)) and name != 'subset' and not number_prefix(name);
+
+def parse_style(argument):
+  name, _, files = argument.partition('=');
+  font, _, css = files.partition(':');
+  if not valid_style_name(name) or not font or not css:
+    raise argparse.ArgumentTypeError("expected NAME=FONT:CSS, with a lowercase NAME other than subset or the start of a number word (one, two, twenty, ...), got {}".format(argument));
+  return name, os.path.abspath(font), os.path.abspath(css);
+
+def parse_archive(argument):
+  archive_format(argument);
+  return argument;
+
 parser = argparse.ArgumentParser(description='Generate TeX bindings for the FontAwesome font by Dave Gandy.');
-parser.add_argument('version', help='FontAwesome version, such as "4.3.0"')
-args = parser.parse_args();
-VERSION = args.version;
+parser.add_argument('versions', metavar='VERSION', nargs='+', help='FontAwesome version, such as "4.3.0", release zip, or directory holding the otf font and css of a version; several of them are built concurrently, each into its own output directory')
+parser.add_argument('--output-dir', '-o', metavar='DIR', default='.', help='output directory, holding one subdirectory per version when building several of them (default: current directory)')
+parser.add_argument('--mirror', metavar='DIR', help='directory of release zips (font-awesome-<version>.zip), looked up before downloading and keeping the downloaded ones')
+parser.add_argument('--checksums', metavar='FILE', help='check the font and css against the sha256 checksums in FILE, as written by sha256sum for font-awesome-<version>/fonts/FontAwesome.otf and font-awesome-<version>/css/font-awesome.css')
+parser.add_argument('--force', action='store_true', help='ignore the build cache and regenerate every file')
+parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(), help='maximum number of concurrent otftotfm runs (default: number of cpus)')
+parser.add_argument('--style', metavar='NAME=FONT:CSS', type=parse_style, action='append', default=[], help='also build the icons of the otf FONT and CSS as style NAME, typeset with \\faicon[NAME]{icon} (can be repeated)')
+parser.add_argument('--subset', metavar='FILE', action='append', help='also build a pdftex subset font covering only the icons used in FILE, either an .aux file of a document loading the package with the subset option, or a list of icon names (can be repeated)')
+parser.add_argument('--report', metavar='FILE', help='write a json report of the run to FILE, with the time, memory and outputs of each stage')
+parser.add_argument('--profile', metavar='DIR', help='dump the cProfile statistics of each stage to DIR/<stage>.prof')
+parser.add_argument('--usage', metavar='FILE', action='append', help='pack the most used glyphs in the first pdftex subfonts, from a usage histogram in FILE, either a json object or `name count\' lines (can be repeated)')
+parser.add_argument('--slot-ledger', metavar='FILE', help='keep the pdftex subfont and slot of every glyph in FILE, a json file updated on each run, so that adding or removing icons only changes the subfonts holding them')
+parser.add_argument('--builtin-tfm', action='store_true', help='write the pdftex tfm files directly and only convert the pfb externally, instead of converting every subfont with otftotfm (experimental)')
+parser.add_argument('--check-tfm', metavar='DIR', help='compare the tfm files written with --builtin-tfm (implied) against the ones otftotfm made for the same enc files, kept in DIR under the same names, and fail on any difference')
+parser.add_argument('--archive', metavar='FILE', type=parse_archive, help='stream the package files into FILE, a .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz laid out as a TDS tree, instead of writing them to the output directory (single version only)')
+parser.add_argument('--watch', action='store_true', help='after building, keep watching the font, css and templates, and regenerate the outputs depending on them whenever they change (single version only)')
 FONT = 'FontAwesome.otf';
 CSS = 'FontAwesome.css';
+TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates');
 
-# download the font (.otf and .css) from fontawesome.io
+# font sources
 # ------------------------------------------------------------------------------
-if os.path.isfile(FONT) and subprocess.check_output(['otfinfo', '-v', FONT], universal_newlines=True).split()[1] == VERSION:
-  print("Font already present");
-else:
-  # download the otf font and css
+# the font and css are read from a release zip, streaming only these two members
+# out of it, or from a directory holding them, either side by side or as
+# unpacked from the zip; zips are looked up in the --mirror directory before
+# being downloaded from fontawesome.io (and kept there); with --checksums, both
+# files are checked against an index in the format of sha256sum, listing the
+# members of the release as font-awesome-<version>/fonts/FontAwesome.otf
+SOURCE_MEMBERS = {FONT: 'fonts/FontAwesome.otf', CSS: 'css/font-awesome.css'};
+ARCHIVE = 'font-awesome-{}.zip';
+ARCHIVE_VERSION = re.compile(r"(?:^|/)font-awesome-([0-9][0-9.]*?)(?:\.zip)?(?:/|$)");
+
+def read_checksums(path):
+  checksums = {};
+  with open(path, 'r') as f:
+    for line in f:
+      fields = line.split(None, 1);
+      if len(fields) == 2:
+        checksums[fields[1].strip().lstrip('*')] = fields[0].lower();
+  return checksums;
+
+def archive_members(archive):
+  members = {};
+  for name in archive.namelist():
+    for filename, member in SOURCE_MEMBERS.items():
+      if name == member or name.endswith('/' + member):
+        members[filename] = name;
+  return members;
+
+def directory_members(directory):
+  for members in [{FONT: FONT, CSS: CSS}, SOURCE_MEMBERS]:
+    if all(os.path.isfile(os.path.join(directory, member)) for member in members.values()):
+      return members;
+  return {};
+
+# resolve a version, release zip or directory to the version and its source,
+# None standing for a download
+def source_files(target):
+  if os.path.isdir(target):
+    members = directory_members(target);
+    if not members:
+      raise GenerateError("[Error] Can't find the font and css in {}".format(target));
+    return read_otf(os.path.join(target, members[FONT]))['version'], os.path.abspath(target);
+  if zipfile.is_zipfile(target):
+    with zipfile.ZipFile(target) as archive:
+      members = archive_members(archive);
+    match = ARCHIVE_VERSION.search(members.get(FONT, '')) or ARCHIVE_VERSION.search(os.path.basename(target));
+    if len(members) < len(SOURCE_MEMBERS) or not match:
+      raise GenerateError("[Error] Can't find the font and css of a release in {}".format(target));
+    return match.group(1), os.path.abspath(target);
+  if args.mirror and os.path.isfile(os.path.join(args.mirror, ARCHIVE.format(target))):
+    if not zipfile.is_zipfile(os.path.join(args.mirror, ARCHIVE.format(target))):
+      raise GenerateError("[Error] {} in the mirror is not a zip file".format(ARCHIVE.format(target)));
+    return target, os.path.abspath(os.path.join(args.mirror, ARCHIVE.format(target)));
+  return target, None;
+
+def checksum_name(version, filename):
+  return 'font-awesome-{}/{}'.format(version, SOURCE_MEMBERS[filename]);
+
+# returns the members of a directory or release zip, and a function opening them
+def open_source(stack, source):
+  if os.path.isdir(source):
+    return directory_members(source), lambda member: open(os.path.join(source, member), 'rb');
+  archive = stack.enter_context(zipfile.ZipFile(source));
+  return archive_members(archive), archive.open;
+
+def source_digest(source, filename):
+  with contextlib.ExitStack() as stack:
+    members, open_member = open_source(stack, source);
+    sha = hashlib.sha256();
+    with open_member(members[filename]) as member:
+      for chunk in iter(lambda: member.read(1 << 16), b''):
+        sha.update(chunk);
+  return sha.hexdigest();
+
+# stream the given files out of the source, checking them on the way; they are
+# only moved into place once all of them passed their checksum, and their
+# digests are returned
+def extract_sources(version, source, filenames, checksums=None):
+  extracted = {};
+  digests = {};
+  try:
+    with contextlib.ExitStack() as stack:
+      members, open_member = open_source(stack, source);
+      for filename in filenames:
+        sha = hashlib.sha256();
+        with open_member(members[filename]) as member, tempfile.NamedTemporaryFile(dir='.', prefix='.' + filename, delete=False) as f:
+          extracted[filename] = f.name;
+          for chunk in iter(lambda: member.read(1 << 16), b''):
+            sha.update(chunk);
+            f.write(chunk);
+        digests[filename] = sha.hexdigest();
+        name = checksum_name(version, filename);
+        if checksums is not None and checksums.get(name) != digests[filename]:
+          raise GenerateError("[Error] {} for {} in {}".format("Checksum mismatch" if name in checksums else "No checksum", name, source));
+    for filename in filenames:
+      move_output(extracted.pop(filename), filename);
+  finally:
+    for path in extracted.values():
+      os.remove(path);
+  return digests;
+
+# download the release zip from fontawesome.io, into a temporary file only moved
+# into place once complete, so that a failed download leaves no broken zip in the
+# mirror
+def download_font(version, directory):
   print("Downloading the font and css...", end="");
+  archive = os.path.join(directory, ARCHIVE.format(version));
+  with tempfile.NamedTemporaryFile(dir=directory, prefix='.' + ARCHIVE.format(version), delete=False) as f:
+    pass;
   try:
-    ZIP = "font-awesome-{}.zip".format(VERSION);
-    subprocess.call(['curl', '-s', '-f', '-LOk', "http://fontawesome.io/assets/" + ZIP]);
-    subprocess.call(['unzip', '-q', ZIP]);
-    os.rename("font-awesome-{}/fonts/FontAwesome.otf".format(VERSION), FONT)
-    os.rename("font-awesome-{}/css/font-awesome.css".format(VERSION), CSS)
-    subprocess.call(['rm', '-R', ZIP, "font-awesome-{}/".format(VERSION)]);
-  except:
-    sys.exit("[Error] Can't download and extract the font: {}".format(sys.exc_info()[1]))
+    result = run_command(['curl', '-s', '-f', '-Lk', '-o', f.name, "http://fontawesome.io/assets/" + ARCHIVE.format(version)]);
+    if result.returncode != 0 or not zipfile.is_zipfile(f.name):
+      raise GenerateError("[Error] Can't download the font: curl exited with {}".format(result.returncode));
+    os.replace(f.name, archive);
+  finally:
+    if os.path.exists(f.name):
+      os.remove(f.name);
   print(" done");
-  # convert the otf font to 1000 UPM to prevent a bug in xdvipdfmx causing bad
-  # (cfr http://tex.stackexchange.com/questions/134121/fontawesome-icons-are-getting-too-big-using-xelatex)
+  return archive;
+
+# convert the otf font to 1000 UPM to prevent a bug in xdvipdfmx causing bad
+# (cfr http://tex.stackexchange.com/questions/134121/fontawesome-icons-are-getting-too-big-using-xelatex)
+def convert_font():
   print("Converting the font to 1000 upm...", end="");
+  try:
+    import fontforge; # only needed here, and slow to import
+  except ImportError:
+    raise GenerateError("\n[Error] Converting the font to 1000 upm needs the fontforge python module");
   font = fontforge.open(FONT);
   font.em = 1000;
   font.generate("FontAwesome-1000upm.otf");
@@ -519,118 +984,384 @@ else:
   print(" done");
 
 # ==============================================================================
-# generic
+# glyph catalog
 # ==============================================================================
+# the catalog lists every icon and alias, along with its codepoint, canonical
+# glyph, pdftex glyph name, subfont and slot, and tex macro name; all the files
+# below are generated from it, and other tools may load it as well
+# ------------------------------------------------------------------------------
+CATALOG = 'fontawesome-catalog.json';
+CATALOG_FORMAT = 1;
+CATALOG_FIELDS = ['name', 'codepoint', 'target', 'glyph', 'subfont', 'slot', 'macro'];
+
 # parse the css to get the associated symbols numbers of each glyph
 # ------------------------------------------------------------------------------
-print("Identifying glyphs from css...", end="");
-css_file = open(CSS, 'r');
-css = css_file.read();
-css_file.close();
-# identify independent icons (icon styles were named icon-* in version 3.1.0, fa-* in version 4.3.0+
-pattern = re.compile(r"\.(icon|fa)-([a-z0-9-]+):before\s*\{\s*content:\s*\"(\\[0-9a-fA-F]{4,4})\";?\s*\}", re.MULTILINE);
-glyphs = [ (glyph_name, glyph_symbol) for (icon_or_fa, glyph_name, glyph_symbol) in re.findall(pattern, css)];
-# identify aliases
-pattern = re.compile(r"(?=\.(icon|fa)-([a-z0-9-]+):before,\s*\.(icon|fa)-([a-z0-9-]+):before\s*[,{])", re.MULTILINE);
-aliases = dict([ (glyph_alias, glyph_name) for (icon_or_fa1, glyph_alias, icon_or_fa2, glyph_name) in re.findall(pattern, css)]);
-del(css);
+# single pass tokenizer over the css, read by chunks from a stream; yields the
+# icon names of each selector group (e.g. ".fa-close:before, .fa-times:before")
+# along with the codepoint of its content property
+# (icon styles were named icon-* in version 3.1.0, fa-* in version 4.3.0+)
+CSS_STRING = r""""(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'""";
+CSS_RULE = re.compile(r"""([^{}"'/]*(?:/(?!\*)[^{}"'/]*)*)\{([^{}"'/]*(?:(?:""" + CSS_STRING + r"""|/(?!\*))[^{}"'/]*)*)\}"""); # a rule without comments nor nested blocks
+CSS_TOKEN = re.compile(r"""/\*.*?\*/|""" + CSS_STRING + r"""|[{}]|/\*|["']""", re.DOTALL);
+CSS_ICON_SELECTOR = re.compile(r"(?:^|,)\s*\.(?:icon|fa)-([a-z0-9-]+)::?before\s*(?=,|$)");
+CSS_CONTENT = re.compile(r"""(?:^|;)\s*content\s*:\s*(["'])((?:\\.|(?!\1).)*)\1""", re.DOTALL);
+CSS_ESCAPE = re.compile(r"\\([0-9a-fA-F]{1,6})");
+
+def css_codepoint(content):
+  escape = CSS_ESCAPE.match(content);
+  if escape:
+    return int(escape.group(1), 16);
+  return ord(content) if len(content) == 1 else None;
+
+def css_rule(prelude, block):
+  names = CSS_ICON_SELECTOR.findall(prelude) if 'before' in prelude else None;
+  content = CSS_CONTENT.search(block) if names else None;
+  codepoint = css_codepoint(content.group(2)) if content else None;
+  return (names, codepoint) if codepoint is not None else None;
+
+def parse_css(stream, chunk_size=1 << 16):
+  text = [];     # pieces of the current selector or block, without comments
+  preludes = []; # stack of the selectors of the currently open blocks
+  buffer = '';
+  eof = False;
+  while not eof:
+    chunk = stream.read(chunk_size);
+    eof = not chunk;
+    buffer += chunk;
+    pos = scan = 0; # start of the pending text, and of the next token search
+    while True:
+      # fast path for the common case of a whole rule
+      match = CSS_RULE.match(buffer, scan);
+      if match:
+        text.append(buffer[pos:match.start(2)-1]);
+        record = css_rule(''.join(text).strip(), match.group(2));
+        if record:
+          yield record;
+        text = [];
+        pos = scan = match.end();
+        continue;
+      match = CSS_TOKEN.search(buffer, scan);
+      token = match.group() if match else None;
+      if token is None or (token in ('/*', '"', "'") and not eof):
+        # no more tokens, or a comment or string continuing in the next chunk
+        end = match.start() if match else len(buffer);
+        if match is None and not eof and buffer.endswith('/') and end > pos:
+          end -= 1; # might be the start of a comment
+        text.append(buffer[pos:end]);
+        buffer = buffer[end:];
+        break;
+      if token[0] in '"\'':
+        scan = match.end(); # keep strings within the text
+        continue;
+      text.append(buffer[pos:match.start()]);
+      if token == '{':
+        preludes.append(''.join(text).strip());
+      elif token == '}':
+        record = css_rule(preludes.pop() if preludes else '', ''.join(text));
+        if record:
+          yield record;
+      elif token == '/*':
+        buffer = ''; # an unterminated comment at the end of the file
+        break;
+      if token in '{}':
+        text = [];
+      pos = scan = match.end();
+
 # recurse through indirect aliases
 def recurse_dictionary (dictionary, key):
   if key in dictionary:
     return recurse_dictionary(dictionary, dictionary[key]) if dictionary[key] in dictionary else dictionary[key];
   else:
     return None;
-for key in aliases:
-  aliases[key] = recurse_dictionary(aliases, key);
-print(" done ({} unique glyphs, {} aliases)".format(len(glyphs), len(aliases)));
-if DEBUG:
-  print("  Aliases:");
-  for key in sorted(aliases):
-    print("    {} => {}".format(key, aliases[key]));
 
-# generate the style file
+def read_css(path):
+  # the last selector of each group names the glyph, the previous ones are aliases
+  glyphs = [];
+  aliases = {};
+  with open(path, 'r') as css_file:
+    for glyph_names, glyph_codepoint in parse_css(css_file):
+      glyphs.append((glyph_names[-1], glyph_codepoint));
+      for glyph_alias in glyph_names[:-1]:
+        aliases[glyph_alias] = glyph_names[-1];
+  for key in aliases:
+    aliases[key] = recurse_dictionary(aliases, key);
+  return glyphs, aliases;
+
+# build the catalog from the css glyphs and aliases and the otf glyph names
 # ------------------------------------------------------------------------------
-print("Generating the generic symbol list...", end="");
-symbols = open('fontawesomesymbols-generic.tex', 'w');
-for glyph_name, glyph_symbol in glyphs:
-  glyph_name = aliases.get(glyph_name, glyph_name); # in case the glyph is named after an alias in the otf file
-  symbols.write("\\def\\fa{}{{\\faicon{{{}}}}}\n".format(glyph_name.replace('-',' ').title().replace(' ',''), glyph_name));
-symbols.write("% aliases\n");
-for alias in aliases:
-  symbols.write("\\def\\fa{}{{\\faicon{{{}}}}}\\expandafter\\def\\csname faicon@{}\\endcsname{{\\faicon{{{}}}}}\n".format(alias.replace('-',' ').title().replace(' ',''), alias, alias, aliases[alias]));
-symbols.close();
-print(" done");
+def tex_macro_name(glyph_name):
+  return 'fa' + glyph_name.replace('-',' ').title().replace(' ','');
+
+# match the otf glyphs to the css icons by joining their codepoints through the
+# cmap, pdftex_replace only overriding the result (or dropping blank glyphs with
+# ".notdef"); returns the css name of every otf glyph, along with the unmatched
+# glyphs and icons as {'kind', 'name', 'codepoint'} records
+def join_glyph_names(glyphs, aliases, glyphs_names, cmap):
+  icons_by_codepoint = dict((glyph_codepoint, aliases.get(glyph_name, glyph_name)) for glyph_name, glyph_codepoint in glyphs);
+  codepoints_by_glyph = dict((glyph_name, codepoint) for codepoint, glyph_name in sorted(cmap.items(), reverse=True));
+  names = {};
+  unmatched = [];
+  for glyph_name in glyphs_names:
+    if glyph_name == '.notdef':
+      continue;
+    codepoint = codepoints_by_glyph.get(glyph_name);
+    if glyph_name in pdftex_replace:
+      names[glyph_name] = pdftex_replace[glyph_name].replace('_', '-');
+    elif codepoint in icons_by_codepoint:
+      names[glyph_name] = icons_by_codepoint[codepoint];
+    else:
+      # still bound, after its otf name
+      names[glyph_name] = glyph_name.replace('_', '-');
+      unmatched.append({'kind': 'glyph without icon', 'name': glyph_name, 'codepoint': codepoint});
+  matched = set(names.values());
+  for glyph_name, glyph_codepoint in glyphs:
+    if aliases.get(glyph_name, glyph_name) not in matched:
+      unmatched.append({'kind': 'icon without glyph', 'name': glyph_name, 'codepoint': glyph_codepoint});
+  return dict((glyph_name, name) for glyph_name, name in names.items() if name != '.notdef'), unmatched;
+
+# the (subfont, slot) of each glyph, given in order by name: the glyphs listed
+# in the slot ledger keep their slot, and the others fill the free slots in
+# order, so that the subfonts of a previous version only change where glyphs
+# were added or removed; without a ledger, this packs the glyphs in order
+def slot_positions(names, ledger):
+  taken = {};
+  used = set();
+  for name in names:
+    position = tuple(ledger.get(name, ()));
+    if len(position) == 2 and position[0] >= 1 and 0 <= position[1] < 256 and position not in used:
+      taken[name] = position;
+      used.add(position);
+  positions = [];
+  free = ((subfont, slot) for subfont in itertools.count(1) for slot in range(256) if (subfont, slot) not in used);
+  for name in names:
+    positions.append(taken[name] if name in taken else next(free));
+  return positions;
+
+def build_catalog(version, glyphs, aliases, glyphs_names, cmap, usage=None, ledger=None):
+  names, unmatched = join_glyph_names(glyphs, aliases, glyphs_names, cmap);
+  # the otf glyphs are laid out in subfonts of up to 256 glyphs
+  glyphs_names = sorted(names);
+  if usage:
+    # pack the most used glyphs first, so that documents load fewer subfonts;
+    # aliases count towards their target and ties stay alphabetical
+    counts = {};
+    for name, count in usage.items():
+      target = aliases.get(name, name);
+      counts[target] = counts.get(target, 0) + count;
+    glyphs_names.sort(key=lambda x: -counts.get(names[x], 0));
+  positions = slot_positions([names[glyph_name] for glyph_name in glyphs_names], ledger or {});
+  subfonts = [['.notdef'] * 256 for subfont in range(max([subfont for subfont, slot in positions] or [0]))];
+  slots = {};
+  for glyph_name, (subfont, slot) in zip(glyphs_names, positions):
+    subfonts[subfont - 1][slot] = glyph_name;
+    slots[names[glyph_name]] = (glyph_name, subfont, slot);
+  # the enc files are filled up with .notdef
+  for subfont in subfonts:
+    while subfont and subfont[-1] == '.notdef':
+      subfont.pop();
+  icons = [];
+  codepoints = {};
+  for glyph_name, glyph_codepoint in glyphs:
+    glyph_name = aliases.get(glyph_name, glyph_name); # in case the glyph is named after an alias in the otf file
+    codepoints[glyph_name] = glyph_codepoint;
+    icons.append([glyph_name, glyph_codepoint, glyph_name, *slots.get(glyph_name, (None, None, None)), tex_macro_name(glyph_name)]);
+  for alias in sorted(aliases):
+    icons.append([alias, codepoints.get(aliases[alias]), aliases[alias], *slots.get(aliases[alias], (None, None, None)), tex_macro_name(alias)]);
+  # otf glyphs missing from the css still get a pdftex binding
+  for pdftex_glyph_name in sorted(slots, key=lambda name: slots[name][1:]):
+    if pdftex_glyph_name not in codepoints:
+      icons.append([pdftex_glyph_name, None, pdftex_glyph_name, *slots[pdftex_glyph_name], tex_macro_name(pdftex_glyph_name)]);
+
+  # icons without a glyph can't be typeset with pdftex, so stop there; glyphs
+  # without an icon only get bound after their otf name
+  if unmatched:
+    print("\n[Issue] xe-/luatex and pdftex glyphs do not match");
+    for kind, heading in [('icon without glyph', 'Icons without a glyph'), ('glyph without icon', 'Glyphs without an icon')]:
+      entries = [entry for entry in unmatched if entry['kind'] == kind];
+      print("  {} ({}):".format(heading, len(entries)));
+      if DEBUG:
+        for entry in entries:
+          print("    {} (U+{})".format(entry['name'], '?' if entry['codepoint'] is None else "{:04X}".format(entry['codepoint'])));
+  missing = [entry['name'] for entry in unmatched if entry['kind'] == 'icon without glyph'];
+  if missing:
+    raise ValueError("no glyph in the font for {}".format(', '.join(missing)));
+
+  return {'format': CATALOG_FORMAT, 'version': version, 'fields': CATALOG_FIELDS, 'icons': icons, 'subfonts': subfonts, 'unmatched': unmatched};
+
+def load_catalog(path):
+  with open(path, 'r') as f:
+    catalog = json.load(f);
+  if catalog.get('format') != CATALOG_FORMAT:
+    raise ValueError("unsupported catalog format {}".format(catalog.get('format')));
+  return catalog;
+
+def save_catalog(catalog, path):
+  write_output(path, json.dumps(catalog, separators=(',', ':')));
+
+# icons and aliases, as (name, codepoint, target, glyph, subfont, slot, macro) tuples
+def catalog_glyphs(catalog):
+  return [icon for icon in catalog['icons'] if icon[0] == icon[2] and icon[1] is not None];
+
+def catalog_aliases(catalog):
+  return [icon for icon in catalog['icons'] if icon[0] != icon[2]];
+
+# slot ledger
+# ------------------------------------------------------------------------------
+# with --slot-ledger, the subfont and slot of every glyph, by style and css name,
+# are kept in a json file from one run (and version) to the next, so that glyphs
+# keep their slot when others are added or removed (see slot_positions)
+LEDGER_FORMAT = 1;
+
+def load_ledger(path):
+  try:
+    with open(path, 'r') as f:
+      ledger = json.load(f);
+  except FileNotFoundError:
+    return {};
+  except ValueError:
+    raise GenerateError("[Error] Can't read the slot ledger {}: {}".format(path, sys.exc_info()[1]));
+  if ledger.get('format') != LEDGER_FORMAT:
+    raise GenerateError("[Error] Unsupported slot ledger format {} in {}".format(ledger.get('format'), path));
+  return ledger['styles'];
+
+def catalog_slots(catalog):
+  return dict((name, [subfont, slot]) for name, codepoint, target, glyph, subfont, slot, macro in catalog['icons'] if name == target and slot is not None);
+
+# one glyph per line, so that the changes between versions read well in a diff
+def save_ledger(path, styles):
+  ledger = ','.join("\n {}: {{\n{}\n }}".format(json.dumps(style), ',\n'.join("  {}: {}".format(json.dumps(name), json.dumps(styles[style][name])) for name in sorted(styles[style]))) for style in sorted(styles));
+  write_output(path, "{{\"format\": {}, \"styles\": {{{}\n}}}}\n".format(LEDGER_FORMAT, ledger));
 
 
 # ==============================================================================
-# xe- and luatex
+# styles
 # ==============================================================================
-# generate the tex symbols list file
+# besides the default FontAwesome font, named styles can be built from their own
+# font and css (--style NAME=FONT:CSS); their files are named after the style,
+# and their icons typeset with \faicon[style]{name}
 # ------------------------------------------------------------------------------
-print("Generating the xe-/luatex symbol list...", end="");
-symbols = open('fontawesomesymbols-xeluatex.tex', 'w');
-for glyph_name, glyph_symbol in glyphs:
-  glyph_name = aliases.get(glyph_name, glyph_name); # in case the glyph is named after an alias in the otf file
-  symbols.write("\\expandafter\\def\\csname faicon@{}\\endcsname{{{{\\FA\\symbol{{{}}}}}}}\n".format(glyph_name, glyph_symbol.replace('\\','"').upper()));
-symbols.close();
-print(" done");
+def style_suffix(style): # in file names
+  return '-' + style if style else '';
+
+def style_prefix(style): # in control sequence names
+  return style + '@' if style else '';
+
+def style_label(style): # in messages
+  return ' ({})'.format(style) if style else '';
 
 
 # ==============================================================================
-# pdftex
+# generic
 # ==============================================================================
-# use otfinfo to get the list of glyph names in the font
+# the icon definitions of each engine are split into shards, one per first
+# character of the icon names, so that \faicon only loads the shards it needs
+# (see \fontawesome@loadshard in fontawesome.sty); shard definitions are global
+# since they are loaded from within the group of \faicon, and made with
+# \fontawesome@def so that they leave the icons redefined by the document alone
 # ------------------------------------------------------------------------------
-print("Generating the pdftex symbol list...", end="");
-try:
-  glyphs_names = subprocess.check_output(['otfinfo', '-g', FONT], universal_newlines=True).strip().split();
-  glyphs_names = sorted([x for x in glyphs_names if x != '.notdef' and pdftex_replace.get(x) != '.notdef']);
-except:
-  sys.exit("\n[Error] Can't run otfinfo: {}".format(sys.exc_info()[1]))
-
-# check that the pdftex glyph set is the same as the xe-/luatex one
-pdftex_glyphs_names = [pdftex_replace.get(glyph_name, glyph_name).replace('_', '-') for glyph_name in glyphs_names];
-diff1 = set(dict(glyphs).keys()).difference(set(pdftex_glyphs_names)); # or use symmetric_difference()
-diff2 = set(pdftex_glyphs_names).difference(set(dict(glyphs).keys()));
-if diff1 or diff2:
-  print("\n[Issue] xe-/luatex and pdftex glyphs do not match");
-  print("  Missing from pdftex glyphs ({}):".format(len(diff1)));
-  if DEBUG:
-    for missing in sorted(diff1):
-      print("    {}".format(missing));
-  print("  Missing from xe-/luatex glyphs ({}):".format(len(diff2)));
-  if DEBUG:
-    for missing in sorted(diff2):
-      print("    {}".format(missing));
-#  sys.exit();
-
-
-# write the required number of enc files, each with up to 256 glyphs
+def shard_key(glyph_name):
+  return glyph_name[0];
+
+def write_shards(engine, definitions):
+  shards = {};
+  for glyph_name, definition in definitions:
+    shards.setdefault(shard_key(glyph_name), []).append(definition);
+  filenames = [];
+  for key in sorted(shards):
+    filename = 'fontawesomesymbols-{}-{}.tex'.format(engine, key);
+    filenames.append(write_output(filename, "%% start of file `{}'.\n".format(filename) + ''.join(shards[key]) + "%% end of file `{}'.\n".format(filename)));
+  return filenames;
+
+# aliases are bound directly to the glyph of their target, as given by binding
+# for each engine; \fontawesome@alias only makes them expand \faicon on their
+# target instead with the aliasindirection package option (see fontawesome.sty)
+def alias_definitions(catalog, style, binding):
+  definitions = [];
+  for alias, glyph_codepoint, target, glyph, subfont, slot, macro in catalog_aliases(catalog):
+    glyph_binding = binding(glyph_codepoint, subfont, slot);
+    if glyph_binding: # the target is bound with this engine
+      definitions.append((alias, "\\fontawesome@alias{{{}{}}}{{\\faicon{}{{{}}}}}{{{}}}\n".format(style_prefix(style), alias, '[{}]'.format(style) if style else '', target, glyph_binding)));
+  return definitions;
+
+# generate the style file
 # ------------------------------------------------------------------------------
-encfile_count = 0;
-for glyph_count, glyph_name in enumerate(glyphs_names):
-  # open a new enc file if required
-  if glyph_count % 256 == 0:
-    if encfile_count > 0:
-      encfile.write("] def\n");
-      encfile.close();
-    encfile_count += 1;
-    encfile = open("fontawesome{}.enc".format(numbers[encfile_count]), 'w');
-    encfile.write("/fontawesome{} [\n".format(numbers[encfile_count]));
-  # write the glyph
-  encfile.write("/{}\n".format(glyph_name));
-
-# fill the last enc file up to 256 characters
-while glyph_count + 1 < encfile_count * 256:
-  encfile.write("/.notdef\n");
-  glyph_count += 1;
-
-# close the last enc file
-encfile.write("] def\n");
-encfile.close();
-
-# generate the t1 fonts (tfm,pfb)
+def write_generic(catalog):
+  symbols = [];
+  for glyph_name, glyph_codepoint, target, glyph, subfont, slot, macro in catalog_glyphs(catalog):
+    symbols.append("\\def\\{}{{\\faicon{{{}}}}}\n".format(macro, glyph_name));
+  symbols.append("% aliases\n");
+  for alias, glyph_codepoint, target, glyph, subfont, slot, macro in catalog_aliases(catalog):
+    symbols.append("\\def\\{}{{\\faicon{{{}}}}}\n".format(macro, alias));
+  return [write_output('fontawesomesymbols-generic.tex', ''.join(symbols))];
+
+
+# ==============================================================================
+# xe- and luatex
+# ==============================================================================
+# generate the tex symbols list files
 # ------------------------------------------------------------------------------
+def write_xeluatex(catalog, style=''):
+  binding = lambda glyph_codepoint, subfont, slot: None if glyph_codepoint is None else "{{\\FA{}\\symbol{{\"{:X}}}}}".format(style, glyph_codepoint);
+  definitions = [(glyph_name, "\\fontawesome@def{{{}{}}}{{{}}}\n".format(style_prefix(style), glyph_name, binding(glyph_codepoint, subfont, slot))) for glyph_name, glyph_codepoint, target, glyph, subfont, slot, macro in catalog_glyphs(catalog)];
+  return write_shards('xeluatex' + style_suffix(style), definitions + alias_definitions(catalog, style, binding));
+
+# with luatex, \faicon looks the codepoints up in a single lua table instead (see
+# fontawesome.sty), aliases included
+def write_lua(catalog, style=''):
+  filename = 'fontawesomesymbols{}.lua'.format(style_suffix(style));
+  lua = "-- start of file `{}'.\n".format(filename);
+  lua += COPYRIGHT.replace('%%', '--').replace('%', '--');
+  lua += "return {\n";
+  for glyph_name, glyph_codepoint, target, glyph, subfont, slot, macro in catalog_glyphs(catalog) + catalog_aliases(catalog):
+    if glyph_codepoint is not None:
+      lua += "  [\"{}\"] = 0x{:X},\n".format(glyph_name, glyph_codepoint);
+  lua += "}\n";
+  lua += "-- end of file `{}'.\n".format(filename);
+  return [write_output(filename, lua)];
+
+
+# ==============================================================================
+# glyph metrics
+# ==============================================================================
+# the advance width and bounding box of every icon and alias, in font units, so
+# that documents and other tools can lay icons out without typesetting them; the
+# tex table defines \faicon@metric@<name> as {advance}{xmin}{ymin}{xmax}{ymax},
+# unless \fontawesomemetric is already defined when it is loaded; fontawesome.sty
+# loads the tables of every style with the metrics option
+# ------------------------------------------------------------------------------
+METRICS_FORMAT = 1;
+METRICS_FIELDS = ['name', 'advance', 'xmin', 'ymin', 'xmax', 'ymax'];
+
+def build_metrics(catalog, font):
+  otf = read_otf(font);
+  glyph_metrics = read_otf_metrics(font, otf['glyph_names']);
+  icons = [];
+  for glyph_name, glyph_codepoint, target, glyph, subfont, slot, macro in catalog['icons']:
+    if otf['cmap'].get(glyph_codepoint) not in glyph_metrics:
+      continue;
+    advance, box = glyph_metrics[otf['cmap'][glyph_codepoint]];
+    xmin, ymin, xmax, ymax = box or (0, 0, 0, 0);
+    # round outwards, so that the box still encloses the outline
+    icons.append([glyph_name, advance, math.floor(xmin), math.floor(ymin), math.ceil(xmax), math.ceil(ymax)]);
+  return {'format': METRICS_FORMAT, 'version': catalog['version'], 'units_per_em': otf['units_per_em'], 'fields': METRICS_FIELDS, 'icons': icons};
+
+def write_metrics(catalog, font, style=''):
+  metrics = build_metrics(catalog, font);
+  json_filename = 'fontawesome-metrics{}.json'.format(style_suffix(style));
+  tex_filename = 'fontawesomemetrics{}.tex'.format(style_suffix(style));
+  tex = "%% start of file `{}'.\n".format(tex_filename);
+  tex += COPYRIGHT;
+  tex += "\\providecommand*{\\fontawesomemetric}[6]{\\expandafter\\gdef\\csname faicon@metric@#1\\endcsname{{#2}{#3}{#4}{#5}{#6}}}\n";
+  tex += "\\expandafter\\gdef\\csname faicon@unitsperem{}\\endcsname{{{}}}\n".format(style_suffix(style), metrics['units_per_em']);
+  for glyph_name, advance, xmin, ymin, xmax, ymax in metrics['icons']:
+    tex += "\\fontawesomemetric{{{}{}}}{{{}}}{{{}}}{{{}}}{{{}}}{{{}}}\n".format(style_prefix(style), glyph_name, advance, xmin, ymin, xmax, ymax);
+  tex += "%% end of file `{}'.\n".format(tex_filename);
+  return [write_output(json_filename, json.dumps(metrics, separators=(',', ':'))), write_output(tex_filename, tex)];
+
+
+# ==============================================================================
+# pdftex
+# ==============================================================================
 # ensure texmf tree structure
 TFM = "./"; #"texmf/fonts/tfm/public/fontawesome"
 ENC = "./"; #"texmf/fonts/enc/pdftex/public/fontawesome"
@@ -638,73 +1369,346 @@ T1  = "./"; #"texmf/fonts/type1/public/fontawesome"
 OTF = "./"; #"texmf/fonts/opentype/public/fontawesome"
 MAP = "./"; #"texmf/fonts/map/dvips/fontawesome/"
 
-for path in [TFM, ENC, T1, OTF, MAP]:
-  os.makedirs(path, exist_ok=True);
+# convert the font for one enc file, returning the map line, the captured errors
+# and the tfm and pfb files as (path, content) pairs; each run gets its own
+# directory, holding a copy of the enc file, so that concurrent runs don't write
+# the same pfb file at once, and the caller writes (or archives) the files in a
+# fixed order
+def run_otftotfm(encfile_name, encoding, font=FONT):
+  try:
+    with tempfile.TemporaryDirectory(dir=T1) as directory:
+      with open(os.path.join(directory, encfile_name), 'w') as f:
+        f.write(encoding);
+      command = ['otftotfm', font,
+        '--literal-encoding=' + os.path.join(directory, encfile_name),
+        '--tfm-directory=' + directory,
+        '--encoding-directory=' + ENC,
+        '--type1-directory=' + directory];
+      result = run_command(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True);
+      products = [];
+      for output in sorted(os.listdir(directory)):
+        if output != encfile_name:
+          with open(os.path.join(directory, output), 'rb') as f:
+            products.append((os.path.join(T1 if output.endswith('.pfb') else TFM, output), f.read()));
+  except subprocess.CalledProcessError as e:
+    raise GenerateError("[Error] Can't run otftotfm on {}: {}".format(encfile_name, e.stderr.strip()));
+  except:
+    raise GenerateError("[Error] Can't run otftotfm: {}".format(sys.exc_info()[1]));
+  return result.stdout.strip(), result.stderr, products;
+
+# tfm files
+# ------------------------------------------------------------------------------
+# with --builtin-tfm, the tfm files of all the subfonts are written from a single
+# parse of the font, with the dimensions otftotfm gives them: a 10pt design size,
+# 1em being the design size, heights and depths from the glyph bounding boxes,
+# the space font dimensions from the space glyph, and the checksum pltotf
+# computes from the widths; only the pfb, which is the same for every subfont,
+# is still converted by an external tool, cfftot1 (or otftotfm when cfftot1
+# isn't installed)
+TFM_DESIGN_SIZE = 10; # pt
+
+def fix_word(value):
+  return int(round(value * (1 << 20)));
+
+# reduce the distinct values of a dimension to the number a tfm table can hold,
+# merging the closest ones as pltotf does; returns the table, starting with 0,
+# and the index of every value in it
+def tfm_dimensions(values, count):
+  distinct = sorted(set(values) - {0});
+  span = 0;
+  while True:
+    clusters = [];
+    next_span = None;
+    for value in distinct:
+      if clusters and value - clusters[-1][0] <= span:
+        clusters[-1][1] = value;
+      else:
+        if clusters:
+          next_span = value - clusters[-1][0] if next_span is None else min(next_span, value - clusters[-1][0]);
+        clusters.append([value, value]);
+    if len(clusters) <= count:
+      break;
+    span = next_span;
+  index = {0: 0};
+  for i, (low, high) in enumerate(clusters, 1):
+    for value in distinct:
+      if low <= value <= high:
+        index[value] = i;
+  return [0] + [(low + high) // 2 for low, high in clusters], index;
+
+# the checksum pltotf computes when the property list has none, from the width
+# of every char
+def tfm_checksum(bc, ec, widths):
+  checksum = [bc, ec, bc, ec];
+  for slot in range(bc, ec + 1):
+    if slot in widths:
+      width = widths[slot] + (slot + 4) * 0o20000000;
+      checksum = [(2 * c + width) % m for c, m in zip(checksum, [255, 253, 251, 247])];
+  return checksum[0] << 24 | checksum[1] << 16 | checksum[2] << 8 | checksum[3];
+
+def bcpl_string(string, size):
+  string = string.encode('ascii', 'replace')[:size - 1];
+  return bytes([len(string)]) + string + bytes(size - 1 - len(string));
+
+# the tfm of one subfont, given the glyph name of each slot
+def tfm_file(glyph_names, otf, metrics, coding_scheme):
+  units_per_em = otf['units_per_em'];
+  chars = {};
+  for slot, glyph_name in enumerate(glyph_names):
+    if glyph_name != '.notdef' and glyph_name in metrics:
+      advance, box = metrics[glyph_name];
+      xmin, ymin, xmax, ymax = box or (0, 0, 0, 0);
+      chars[slot] = (fix_word(advance / units_per_em), fix_word(max(ymax, 0) / units_per_em), fix_word(max(-ymin, 0) / units_per_em));
+  bc, ec = (min(chars), max(chars)) if chars else (1, 0);
+  widths, width_index = tfm_dimensions([width for width, height, depth in chars.values()], 255);
+  heights, height_index = tfm_dimensions([height for width, height, depth in chars.values()], 15);
+  depths, depth_index = tfm_dimensions([depth for width, height, depth in chars.values()], 15);
+  italics = [0];
+  space = metrics['space'][0] / units_per_em if 'space' in metrics else 0;
+  parameters = [fix_word(-math.tan(math.radians(otf['italic_angle']))), fix_word(space), fix_word(space / 2), fix_word(space / 3), fix_word(otf['x_height'] / units_per_em), fix_word(1), fix_word(space / 3)];
+
+  header = struct.pack('>II', tfm_checksum(bc, ec, dict((slot, chars[slot][0]) for slot in chars)), fix_word(TFM_DESIGN_SIZE)) + bcpl_string(coding_scheme, 40) + bcpl_string(otf['ps_name'] or '', 20) + bytes(4);
+  char_info = b''.join(struct.pack('>BBBB', width_index[chars[slot][0]], height_index[chars[slot][1]] << 4 | depth_index[chars[slot][2]], 0, 0) if slot in chars else bytes(4) for slot in range(bc, ec + 1));
+  tables = [widths, heights, depths, italics, [], [], [], parameters];
+  lf = 6 + len(header) // 4 + (ec - bc + 1) + sum(len(table) for table in tables);
+  return (struct.pack('>12H', lf, len(header) // 4, bc, ec, *[len(table) for table in tables]) + header + char_info +
+    b''.join(struct.pack('>{}i'.format(len(table)), *table) for table in tables));
+
+# tfm regression check
+# ------------------------------------------------------------------------------
+# with --check-tfm, the tfm files written are compared with the ones otftotfm
+# made for the same enc files: the header, the checksum, the font parameters and
+# the char_info of every char, resolved to its dimensions
+def read_tfm(data):
+  lf, lh, bc, ec, nw, nh, nd, ni, nl, nk, ne, np = struct.unpack_from('>12H', data);
+  checksum, design_size = struct.unpack_from('>Ii', data, 24);
+  header = data[24:24 + 4 * lh];
+  offset = 24 + 4 * lh;
+  char_info = [struct.unpack_from('>BBBB', data, offset + 4 * i) for i in range(ec - bc + 1)];
+  offset += 4 * len(char_info);
+  tables = [];
+  for count in [nw, nh, nd, ni, nl, nk, ne, np]:
+    tables.append(list(struct.unpack_from('>{}i'.format(count), data, offset)));
+    offset += 4 * count;
+  widths, heights, depths, italics = tables[:4];
+  chars = {};
+  for slot, (width, height_depth, italic_tag, remainder) in enumerate(char_info, bc):
+    if width:
+      chars[slot] = (widths[width], heights[height_depth >> 4], depths[height_depth & 15], italics[italic_tag >> 2], italic_tag & 3, remainder);
+  return {'checksum': checksum, 'design_size': design_size,
+    'coding_scheme': header[9:9 + header[8]].decode('ascii', 'replace') if lh >= 12 else '',
+    'family': header[49:49 + header[48]].decode('ascii', 'replace') if lh >= 17 else '',
+    'parameters': tables[7], 'chars': chars};
 
-# generate the t1 files
-maplines = [];
-otftotfm_errors = open("otftotfm_errors.log", 'w');
-for i in range(1, encfile_count+1):
+def compare_tfm(expected, actual):
+  differences = [];
+  for field in ['checksum', 'design_size', 'coding_scheme', 'family', 'parameters']:
+    if expected[field] != actual[field]:
+      differences.append("{} {} instead of {}".format(field, actual[field], expected[field]));
+  for slot in sorted(set(expected['chars']) | set(actual['chars'])):
+    if expected['chars'].get(slot) != actual['chars'].get(slot):
+      differences.append("char {} {} instead of {}".format(slot, actual['chars'].get(slot), expected['chars'].get(slot)));
+  return differences;
+
+# returns the number of tfm files checked, those missing from the reference
+# directory being skipped
+def check_tfms(paths, reference):
+  checked = 0;
+  differences = [];
+  for path in paths:
+    expected = os.path.join(reference, os.path.basename(path));
+    if os.path.isfile(expected):
+      with open(expected, 'rb') as f, open(path, 'rb') as g:
+        differences += ["{}: {}".format(os.path.basename(path), difference) for difference in compare_tfm(read_tfm(f.read()), read_tfm(g.read()))];
+      checked += 1;
+  if differences:
+    raise GenerateError("\n[Error] The tfm files differ from the otftotfm ones in {}:\n  {}".format(reference, '\n  '.join(differences)));
+  return checked;
+
+# convert the font for all the enc files, returning the map line, errors and
+# outputs of each as run_otftotfm does; with external (the default, without
+# --builtin-tfm), or for fonts whose metrics can't be read, otftotfm converts
+# every subfont
+def convert_subfonts(encodings, font, jobs, external=False):
+  if not external:
+    try:
+      otf = read_otf(font);
+      metrics = read_otf_metrics(font, otf['glyph_names']);
+    except:
+      external = True;
+  if external:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+      return list(executor.map(lambda encfile: run_otftotfm(*encfile, font), encodings));
+
+  if not encodings:
+    return [];
+  ps_name = otf['ps_name'] or os.path.splitext(os.path.basename(font))[0];
+  if shutil.which('cfftot1'):
+    pfb, errors = run_cfftot1(font, ps_name);
+  else:
+    mapline, errors, products = run_otftotfm(*encodings[0], font);
+    pfb = [(path, content) for path, content in products if path.endswith('.pfb')];
+  pfb_filename = os.path.basename(pfb[0][0]) if pfb else ps_name + '.pfb';
+  results = [];
+  for encfile_name, encoding in encodings:
+    encoding_name = os.path.splitext(encfile_name)[0];
+    glyph_names = re.findall(r"^/(\S+)$", encoding, re.M);
+    tfm_name = '{}--{}'.format(ps_name, encoding_name);
+    errors += ''.join("warning: glyph '{}' not found in {}\n".format(glyph_name, os.path.basename(font)) for glyph_name in glyph_names if glyph_name != '.notdef' and glyph_name not in metrics);
+    mapline = '{} {} "{} ReEncodeFont" <[{} <{}'.format(tfm_name, ps_name, encoding_name, encfile_name, pfb_filename);
+    results.append((mapline, errors, [(os.path.join(TFM, tfm_name + '.tfm'), tfm_file(glyph_names, otf, metrics, encoding_name.upper()))] + pfb));
+    pfb, errors = [], '';
+  return results;
+
+# convert the font to a pfb, returned as a list of (path, content) pairs like
+# the otftotfm outputs, along with the captured errors
+def run_cfftot1(font, ps_name):
   try:
-    encfile_name = 'fontawesome{}.enc'.format(numbers[i]);
-    command = ['otftotfm', FONT,
-      '--literal-encoding=' + encfile_name,
-      '--tfm-directory=' + TFM,
-      '--encoding-directory=' + ENC,
-      '--type1-directory=' + T1];
-    mapline = subprocess.check_output(command, stderr=otftotfm_errors, universal_newlines=True).strip();
-    maplines.append(mapline);
-    os.rename(encfile_name, os.path.join(ENC, encfile_name));
-    if OTF is not "./":
-      shutil.copy(FONT, os.path.join(OTF, FONT));
+    with tempfile.TemporaryDirectory(dir=T1) as directory:
+      result = run_command(['cfftot1', font, os.path.join(directory, ps_name + '.pfb')], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True);
+      with open(os.path.join(directory, ps_name + '.pfb'), 'rb') as f:
+        return [(os.path.join(T1, ps_name + '.pfb'), f.read())], result.stderr;
+  except subprocess.CalledProcessError as e:
+    raise GenerateError("[Error] Can't run cfftot1 on {}: {}".format(font, e.stderr.strip()));
   except:
-    sys.exit("[Error] Can't run otftotfm: {}".format(sys.exc_info()[1]));
-otftotfm_errors.close();
-
-# generate the map file
-map_filename = 'fontawesome.map';
-map = open(os.path.join(MAP, map_filename), 'w');
-map.write("%% start of file `{}'.\n".format(map_filename));
-map.write(COPYRIGHT);
-map.write("\n".join(maplines) + "\n");
-map.write("\n%% end of file `{}'.\n".format(map_filename));
-map.close();
-
-# generate the font definition (.fd) files
-for i in range(1, encfile_count+1):
-  fd_filename = 'ufontawesome{}.fd'.format(numbers[i]);
-  fd = open(fd_filename, 'w');
-  fd.write("%% start of file `{}'.\n".format(fd_filename));
-  fd.write(COPYRIGHT);
-  fd.write("\\ProvidesFile{{{}}}[{:%Y/%m/%d} Font definitions for U/fontawesome{}.]\n\n".format(fd_filename, datetime.date.today(), numbers[i]));
-  fd.write("\\DeclareFontFamily{{U}}{{fontawesome{}}}{{}}\n".format(numbers[i]));
-  fd.write("\\DeclareFontShape{{U}}{{fontawesome{}}}{{m}}{{n}}{{<-> FontAwesome--fontawesome{}}}{{}}\n\n".format(numbers[i], numbers[i]));
-  fd.write("\\endinput\n");
-  fd.write("\n%% end of file `{}'.\n".format(fd_filename));
-  fd.close();
-
-# add the \FA... font definitions to the package file
-with open('templates/fontawesome.sty.template', 'r') as template, open('fontawesome.sty', 'w') as sty:
-  for line in template:
-    if line == "% <maplines go here>\n":
-#      sty.write('\n'.join(maplines) + "\n");
-      for i in range(1, encfile_count+1):
-        sty.write("\\DeclareRobustCommand\\FA{}{{\\fontencoding{{U}}\\fontfamily{{fontawesome{}}}\selectfont}}\n".format(numbers[i], numbers[i]));
-    else:
-      sty.write(line);
-template.close();
-sty.close();
+    raise GenerateError("[Error] Can't run cfftot1: {}".format(sys.exc_info()[1]));
+
+# write an enc file, filled up to 256 characters; returns its name and content
+def write_enc(subfont_name, glyph_names):
+  encfile_name = "fontawesome{}.enc".format(subfont_name);
+  encoding = ["/fontawesome{} [\n".format(subfont_name)];
+  for glyph_name in glyph_names:
+    encoding.append("/{}\n".format(glyph_name));
+  for glyph_count in range(len(glyph_names), 256):
+    encoding.append("/.notdef\n");
+  encoding.append("] def\n");
+  write_output(os.path.join(ENC, encfile_name), ''.join(encoding));
+  return encfile_name, ''.join(encoding);
+
+def write_map(map_filename, maplines):
+  map = "%% start of file `{}'.\n".format(map_filename);
+  map += COPYRIGHT;
+  map += "\n".join(maplines) + "\n";
+  map += "\n%% end of file `{}'.\n".format(map_filename);
+  return write_output(os.path.join(MAP, map_filename), map);
+
+# the tfm is named after the map line, as "<ps name>--fontawesome<subfont>"
+def write_fd(subfont_name, tfm_name, date):
+  fd_filename = 'ufontawesome{}.fd'.format(subfont_name);
+  fd = "%% start of file `{}'.\n".format(fd_filename);
+  fd += COPYRIGHT;
+  fd += "\\ProvidesFile{{{}}}[{:%Y/%m/%d} Font definitions for U/fontawesome{}.]\n\n".format(fd_filename, date, subfont_name);
+  fd += "\\DeclareFontFamily{{U}}{{fontawesome{}}}{{}}\n".format(subfont_name);
+  fd += "\\DeclareFontShape{{U}}{{fontawesome{}}}{{m}}{{n}}{{<-> {}}}{{}}\n\n".format(subfont_name, tfm_name);
+  fd += "\\endinput\n";
+  fd += "\n%% end of file `{}'.\n".format(fd_filename);
+  return write_output(fd_filename, fd);
+
+# write the enc files, convert the font for each of them and bind the icons to
+# their subfont and slot; returns the outputs and the map lines
+def write_pdftex(catalog, jobs, font=FONT, style='', external=False):
+  for path in [TFM, ENC, T1, OTF, MAP]:
+    os.makedirs(path, exist_ok=True);
+
+  # write the required number of enc files, each with up to 256 glyphs
+  # ------------------------------------------------------------------------------
+  encodings = [write_enc(style + number_name(i), subfont) for i, subfont in enumerate(catalog['subfonts'], 1)];
+  encfile_names = [encfile_name for encfile_name, encoding in encodings];
+
+  # generate the t1 fonts (tfm,pfb)
+  # ------------------------------------------------------------------------------
+
+  # generate the tfm files, and the pfb shared by all of them
+  if OTF != "./" and not style:
+    shutil.copy(FONT, os.path.join(OTF, FONT));
+  # only the subfonts whose enc file changed are converted again, keeping the
+  # others, and their map line, from the last run
+  generator_digest, font_digest = file_digest(os.path.abspath(__file__)), file_digest(font);
+  subfont_stages = [('pdftex-subfont:' + encfile_name, digest(generator_digest, font_digest, encoding, external)) for encfile_name, encoding in encodings];
+  pending = [i for i, (stage, key) in enumerate(subfont_stages) if not stage_uptodate(stage, key)];
+  converted = dict(zip(pending, convert_subfonts([encodings[i] for i in pending], font, jobs, external)));
+  results = [];
+  for i, (stage, key) in enumerate(subfont_stages):
+    if i in converted:
+      mapline, errors, products = converted[i];
+      for path, content in products:
+        write_output(path, content);
+      outputs = [os.path.join(ENC, encfile_names[i]), os.path.join(TFM, mapline.split()[0] + '.tfm'), os.path.join(T1, mapline.split()[-1].lstrip('<'))];
+      cache['stages'][stage] = {'key': key, 'outputs': outputs, 'mapline': mapline, 'errors': errors};
+    results.append((cache['stages'][stage]['mapline'], cache['stages'][stage]['errors']));
+  maplines = [mapline for mapline, errors in results];
+  write_output("otftotfm_errors{}.log".format(style_suffix(style)), ''.join("% {}\n{}".format(encfile_name, errors) for encfile_name, (mapline, errors) in zip(encfile_names, results) if errors));
 
-# generate the tex symbols list file
+  # generate the tex symbols list files
+  # ------------------------------------------------------------------------------
+  pdftex_glyphs = sorted(set((subfont, slot, glyph_name) for glyph_name, glyph_codepoint, target, glyph, subfont, slot, macro in catalog['icons'] if glyph_name == target and slot is not None));
+  binding = lambda glyph_codepoint, subfont, slot: None if slot is None else "{{\\FA{}{}\\symbol{{{}}}}}".format(style, number_name(subfont), slot);
+  definitions = [(glyph_name, "\\fontawesome@def{{{}{}}}{{{}}}\n".format(style_prefix(style), glyph_name, binding(None, subfont, slot))) for subfont, slot, glyph_name in pdftex_glyphs];
+  symbols_filenames = write_shards('pdftex' + style_suffix(style), definitions + alias_definitions(catalog, style, binding));
+
+  # the tfm and pfb files are named after the map lines: "<tfm name> <ps name> "<enc> ReEncodeFont" <[<enc file> <pfb file>"
+  outputs = list(symbols_filenames);
+  for encfile_name, mapline in zip(encfile_names, maplines):
+    outputs.append(os.path.join(ENC, encfile_name));
+    outputs.append(os.path.join(TFM, mapline.split()[0] + '.tfm'));
+    outputs.append(os.path.join(T1, mapline.split()[-1].lstrip('<')));
+  return sorted(set(outputs)), maplines;
+
+# add the \FA... font definitions to the package file, given the font file and
+# number of subfonts of each style
+def write_sty(styles):
+  sty = [];
+  with open(os.path.join(TEMPLATES, 'fontawesome.sty.template'), 'r') as template:
+    for line in template:
+      if line == "% <metrics tables go here>\n":
+        for style, font, encfile_count in styles[1:]:
+          sty.append("  \\input{{fontawesomemetrics{}.tex}}\n".format(style_suffix(style)));
+      elif line == "% <font families go here>\n":
+        for style, font, encfile_count in styles[1:]:
+          sty.append("\\newfontfamily{{\\FA{}}}{{{}}}\n".format(style, os.path.basename(font)));
+      elif line == "% <maplines go here>\n":
+  #      sty.append('\n'.join(maplines) + "\n");
+        for style, font, encfile_count in styles:
+          for i in range(1, encfile_count+1):
+            sty.append("\\DeclareRobustCommand\\FA{}{}{{\\fontencoding{{U}}\\fontfamily{{fontawesome{}{}}}\\selectfont}}\n".format(style, number_name(i), style, number_name(i)));
+      else:
+        sty.append(line);
+  return [write_output('fontawesome.sty', ''.join(sty))];
+
+# per-document subset, covering only the icons recorded in the aux files by
+# \faicon when the package is loaded with the subset option
 # ------------------------------------------------------------------------------
-symbols_filename = 'fontawesomesymbols-pdftex.tex';
-symbols = open(symbols_filename, 'w');
-symbols.write("%% start of file `{}'.\n".format(symbols_filename));
-for glyph_count, glyph_name in enumerate(pdftex_glyphs_names):
-  symbols.write("\\expandafter\\def\\csname faicon@{}\\endcsname{{{{\\FA{}\\symbol{{{}}}}}}}\n".format(glyph_name, numbers[glyph_count//256 +1], glyph_count % 256));
-symbols.write("\n%% end of file `{}'.\n".format(symbols_filename));
-symbols.close();
-print(" done");
+def read_used_icons(path):
+  with open(path, 'r') as f:
+    text = f.read();
+  if path.endswith('.aux'):
+    return re.findall(r"\\fontawesome@used\{([^{}]*)\}", text);
+  return text.split(); # plain list of icon names
+
+# returns the outputs, along with the icons and glyphs actually subset and the
+# otftotfm errors
+def write_subset(catalog, used_icons, date, external=False):
+  icons = dict((icon[0], icon) for icon in catalog['icons']);
+  unknown_icons = [icon for icon in used_icons if icon not in icons or icons[icon][3] is None];
+  if unknown_icons:
+    print("\n[Issue] Unknown icons, left out of the subset: {}".format(', '.join(unknown_icons)));
+  used_icons = [icon for icon in used_icons if icon not in unknown_icons];
+  subset_glyphs = sorted(set(icons[icon][3] for icon in used_icons));
+  if len(subset_glyphs) > 256:
+    raise GenerateError("[Error] Can't subset more than 256 glyphs ({} used)".format(len(subset_glyphs)));
+  encfile_name, encoding = write_enc('subset', subset_glyphs);
+  mapline, errors, products = convert_subfonts([(encfile_name, encoding)], FONT, 1, external)[0];
+  for path, content in products:
+    write_output(path, content);
+  # aliases are bound directly to their glyph
+  definitions = [(icon, "\\fontawesome@def{{{}}}{{{{\\FAsubset\\symbol{{{}}}}}}}\n".format(icon, subset_glyphs.index(icons[icon][3]))) for icon in used_icons];
+  outputs = write_shards('subset', definitions);
+  outputs.append(write_map('fontawesomesubset.map', [mapline]));
+  outputs.append(write_fd('subset', mapline.split()[0], date));
+  outputs.append(os.path.join(ENC, encfile_name));
+  outputs.append(os.path.join(TFM, mapline.split()[0] + '.tfm'));
+  outputs.append(os.path.join(T1, mapline.split()[-1].lstrip('<')));
+  return outputs, used_icons, subset_glyphs, errors;
 
 
 # ==============================================================================
@@ -712,17 +1716,458 @@ print(" done");
 # ==============================================================================
 # generate the doc
 # ------------------------------------------------------------------------------
-print("Generating the documentation...", end="");
-all_glyphs = sorted([(glyph, '') for glyph, symbol in glyphs] + [(alias, 'alias') for alias in aliases]);
-with open('templates/fontawesome.tex.template', 'r') as template, open('fontawesome.tex', 'w') as doc:
-  for line in template:
-    if line == "% <showcaseicon commands go here>\n":
-      for glyph, tag in all_glyphs:
-        glyph_macro_name = glyph.replace('-',' ').title().replace(' ','');
-        doc.write("  \\showcaseicon{{{}}}{{{}}}{{{}}}\n".format(glyph, tex_macro_names_replace.get('fa'+glyph_macro_name, 'fa'+glyph_macro_name), tag));
+def write_doc(catalog):
+  all_glyphs = sorted([(glyph, macro, '') for glyph, codepoint, target, pdftex_glyph, subfont, slot, macro in catalog_glyphs(catalog)] + [(alias, macro, 'alias') for alias, codepoint, target, pdftex_glyph, subfont, slot, macro in catalog_aliases(catalog)]);
+  doc = [];
+  with open(os.path.join(TEMPLATES, 'fontawesome.tex.template'), 'r') as template:
+    for line in template:
+      if line == "% <showcaseicon commands go here>\n":
+        for glyph, macro, tag in all_glyphs:
+          doc.append("  \\showcaseicon{{{}}}{{{}}}{{{}}}\n".format(glyph, tex_macro_names_replace.get(macro, macro), tag));
+      else:
+        doc.append(line);
+  return [write_output('fontawesome.tex', ''.join(doc))];
+
+
+# ==============================================================================
+# main
+# ==============================================================================
+# the digests of this script, the templates and the replacement tables are the
+# same for every version, and computed once per batch
+# ------------------------------------------------------------------------------
+def shared_digests():
+  return (file_digest(os.path.abspath(__file__)), # any change to this script invalidates the whole cache
+    file_digest(os.path.join(TEMPLATES, 'fontawesome.sty.template')),
+    file_digest(os.path.join(TEMPLATES, 'fontawesome.tex.template')),
+    digest(sorted(pdftex_replace.items()), sorted(tex_macro_names_replace.items())));
+
+# build one version into its output directory, logging to a file when several
+# versions are built at once
+def build_tree(version, source, output_dir, options, shared, log=None):
+  global args;
+  args = options;
+  os.makedirs(output_dir, exist_ok=True);
+  cwd = os.getcwd();
+  os.chdir(output_dir);
+  try:
+    with contextlib.ExitStack() as stack:
+      if log:
+        stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(log, 'w'))));
+      build(version, source, shared);
+  finally:
+    close_archive(options.archive, complete=False);
+    os.chdir(cwd);
+  return version;
+
+# run each stage in turn, skipping those whose inputs didn't change; catalogs
+# stay in memory across the builds of a --watch session
+# ------------------------------------------------------------------------------
+loaded_catalogs = {};
+
+# memory is only traced for the report, and never left on after a build, failed
+# or not, unless the caller was tracing it already
+def build(version, source, shared):
+  tracing = args.report and not tracemalloc.is_tracing();
+  if tracing:
+    tracemalloc.start();
+  try:
+    build_stages(version, source, shared);
+  finally:
+    if tracing:
+      tracemalloc.stop();
+
+def build_stages(version, source, shared):
+  global cache;
+  report.clear();
+  report.update({'version': version, 'date': datetime.datetime.now().isoformat(timespec='seconds'), 'start': time.perf_counter(), 'stages': {}, 'counts': {}});
+  subprocesses.clear(); # recorded per build
+  cache = load_cache();
+
+  with timed_stage('download'):
+    checksums = read_checksums(args.checksums) if args.checksums else None;
+    font_present = os.path.isfile(FONT) and read_otf(FONT)['version'] == version;
+    # the font is also extracted again when the one in a local source changed
+    # with the same version, the cache keeping the digest it was extracted from
+    if font_present and source and cache['stages'].get('download', {}).get('key') != source_digest(source, FONT):
+      font_present = False;
+    # a font already present is checked as well, and extracted again when it
+    # doesn't match its checksum
+    if font_present and checksums is not None and checksums.get(checksum_name(version, FONT)) != file_digest(FONT):
+      print("[Issue] {} doesn't match its checksum, extracting it again".format(FONT));
+      font_present = False;
+    if font_present:
+      print("Font already present");
+    if not font_present or source:
+      # the css is always refreshed from a local source, the font only when its version changed
+      archive = None if source else download_font(version, args.mirror or '.');
+      print("Extracting the {}...".format('css' if font_present else 'font and css'), end="");
+      digests = extract_sources(version, source or archive, [CSS] if font_present else [FONT, CSS], checksums);
+      print(" done");
+      if archive and not args.mirror:
+        os.remove(archive);
+      if not font_present:
+        if read_otf(FONT)['units_per_em'] != 1000:
+          convert_font();
+        stage_record('download', digests[FONT], [FONT]);
+
+  # the fonts of the named styles are copied next to the default one, named
+  # after their style so that they can't overwrite it
+  styles = [('', FONT, CSS)];
+  for style, font, css in args.style:
+    with open(font, 'rb') as f:
+      styles.append((style, write_output(os.path.join(OTF, 'FontAwesome{}{}'.format(style_suffix(style), os.path.splitext(font)[1])), f.read()), css));
+
+  # the fonts stay in the output directory, as the other stages read them
+  date = build_date(FONT);
+  if args.archive:
+    open_archive(args.archive, date);
+    for style, font, css in styles:
+      with open(font, 'rb') as f:
+        archive_output(font, f.read());
+
+  # hash the inputs of each stage
+  generator_digest, sty_template_digest, doc_template_digest, tables_digest = shared;
+  usage = {};
+  for path in args.usage or []:
+    for name, count in read_usage(path).items():
+      usage[name] = usage.get(name, 0) + count;
+  ledger = load_ledger(args.slot_ledger) if args.slot_ledger else None;
+  keys = {};
+  font_digests = {};
+  catalogs = {};
+  catalog_digests = {};
+
+  for style, font, css in styles:
+    suffix, label = style_suffix(style), style_label(style);
+    catalog_filename = 'fontawesome-catalog{}.json'.format(suffix);
+    font_digests[style] = file_digest(font);
+    keys['catalog' + suffix] = digest(generator_digest, version, font_digests[style], file_digest(css), tables_digest, sorted(usage.items()) if not style else [], ledger is not None);
+    # with a slot ledger, the catalog is kept as long as the ledger holds the
+    # slots it assigned, as saved after building it, so that the run saving the
+    # ledger for the first time isn't followed by a rebuild
+    ledger_digest = None if ledger is None else digest(sorted(ledger.get(style, {}).items()));
+
+    # glyph catalog
+    with timed_stage('catalog' + suffix):
+      if stage_uptodate('catalog' + suffix, keys['catalog' + suffix]) and cache['stages']['catalog' + suffix].get('ledger') == ledger_digest:
+        print("Glyph catalog{} already up to date".format(label));
+        catalog = loaded_catalogs.get(keys['catalog' + suffix]) or load_catalog(catalog_filename);
+      else:
+        print("Identifying glyphs from css{}...".format(label), end="");
+        glyphs, aliases = read_css(css);
+        print(" done ({} unique glyphs, {} aliases)".format(len(glyphs), len(aliases)));
+        if DEBUG:
+          print("  Aliases:");
+          for key in sorted(aliases):
+            print("    {} => {}".format(key, aliases[key]));
+        print("Building the glyph catalog{}...".format(label), end="");
+        try:
+          otf = read_otf(font);
+        except:
+          raise GenerateError("\n[Error] Can't read the font: {}".format(sys.exc_info()[1]))
+        try:
+          catalog = build_catalog(version, glyphs, aliases, otf['glyph_names'], otf['cmap'], usage if not style else None, None if ledger is None else ledger.get(style, {}));
+        except ValueError:
+          raise GenerateError("[Error] Can't build the glyph catalog: {}".format(sys.exc_info()[1]))
+        save_catalog(catalog, catalog_filename);
+        stage_record('catalog' + suffix, keys['catalog' + suffix], [catalog_filename], ledger=None if ledger is None else digest(sorted(catalog_slots(catalog).items())));
+        print(" done");
+
+    loaded_catalogs[keys['catalog' + suffix]] = catalog;
+    report['counts']['glyphs'] = report['counts'].get('glyphs', 0) + len(catalog_glyphs(catalog));
+    report['counts']['aliases'] = report['counts'].get('aliases', 0) + len(catalog_aliases(catalog));
+    report.setdefault('unmatched', []).extend(dict(entry, style=style) for entry in catalog.get('unmatched', []));
+    catalogs[style] = catalog;
+    catalog_digests[style] = digest(catalog);
+    keys['xeluatex' + suffix] = digest(generator_digest, catalog_digests[style]);
+    keys['lua' + suffix]      = digest(generator_digest, catalog_digests[style]);
+    keys['metrics' + suffix]  = digest(generator_digest, font_digests[style], catalog_digests[style]);
+    keys['pdftex' + suffix]   = digest(generator_digest, font_digests[style], catalog_digests[style], args.builtin_tfm);
+
+    # generic, for the default style only: the icon commands of the styles would clash
+    if not style:
+      keys['generic'] = digest(generator_digest, catalog_digests[style]);
+      with timed_stage('generic'):
+        if stage_uptodate('generic', keys['generic']):
+          print("Generic symbol list already up to date");
+        else:
+          print("Generating the generic symbol list...", end="");
+          stage_record('generic', keys['generic'], write_generic(catalog));
+          print(" done");
+
+    # xe- and luatex
+    with timed_stage('xeluatex' + suffix):
+      if stage_uptodate('xeluatex' + suffix, keys['xeluatex' + suffix]):
+        print("Xe-/luatex symbol list{} already up to date".format(label));
+      else:
+        print("Generating the xe-/luatex symbol list{}...".format(label), end="");
+        stage_record('xeluatex' + suffix, keys['xeluatex' + suffix], write_xeluatex(catalog, style));
+        print(" done");
+
+    # luatex
+    with timed_stage('lua' + suffix):
+      if stage_uptodate('lua' + suffix, keys['lua' + suffix]):
+        print("Luatex symbol table{} already up to date".format(label));
+      else:
+        print("Generating the luatex symbol table{}...".format(label), end="");
+        stage_record('lua' + suffix, keys['lua' + suffix], write_lua(catalog, style));
+        print(" done");
+
+    # glyph metrics
+    with timed_stage('metrics' + suffix):
+      if stage_uptodate('metrics' + suffix, keys['metrics' + suffix]):
+        print("Glyph metrics{} already up to date".format(label));
+      else:
+        print("Measuring the glyphs{}...".format(label), end="");
+        try:
+          outputs = write_metrics(catalog, font, style);
+        except:
+          raise GenerateError("\n[Error] Can't read the glyph metrics: {}".format(sys.exc_info()[1]))
+        stage_record('metrics' + suffix, keys['metrics' + suffix], outputs);
+        print(" done");
+
+  # the ledger is only written when the slots changed
+  if args.slot_ledger:
+    slots = dict(ledger, **dict((style, catalog_slots(catalogs[style])) for style in catalogs));
+    if slots != ledger:
+      save_ledger(args.slot_ledger, slots);
+
+  catalog = catalogs[''];
+  catalog_digest = catalog_digests[''];
+  font_digest = font_digests[''];
+  keys['doc'] = digest(generator_digest, catalog_digest, doc_template_digest, tables_digest);
+
+  # pdftex, converting the fonts of all the styles concurrently
+  with timed_stage('pdftex'):
+    maplines = {};
+    pending = [];
+    for style, font, css in styles:
+      suffix, label = style_suffix(style), style_label(style);
+      if stage_uptodate('pdftex' + suffix, keys['pdftex' + suffix]):
+        print("Pdftex symbol list and fonts{} already up to date".format(label));
+        maplines[style] = cache['stages']['pdftex' + suffix]['maplines'];
+      else:
+        pending.append((style, font));
+    if pending:
+      print("Generating the pdftex symbol list{}...".format(''.join(style_label(style) for style, font in pending if style)), end="");
+      # archive entries are added in a fixed order, one style after the other
+      workers = 1 if args.archive else len(pending);
+      with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda style_font: write_pdftex(catalogs[style_font[0]], max(1, args.jobs // workers), style_font[1], style_font[0], not args.builtin_tfm), pending));
+      for (style, font), (outputs, style_maplines) in zip(pending, results):
+        stage_record('pdftex' + style_suffix(style), keys['pdftex' + style_suffix(style)], outputs, maplines=style_maplines);
+        maplines[style] = style_maplines;
+      print(" done");
+  if args.check_tfm:
+    with timed_stage('check-tfm'):
+      if args.archive:
+        raise GenerateError("[Error] --check-tfm reads the tfm files from the output directory, and can't be used with --archive");
+      print("Checking the tfm files against {}...".format(args.check_tfm), end="");
+      checked = check_tfms(sorted(output for style, font, css in styles for output in cache['stages']['pdftex' + style_suffix(style)]['outputs'] if output.endswith('.tfm')), args.check_tfm);
+      print(" done ({} files)".format(checked));
+  encfile_counts = [(style, font, len(maplines[style])) for style, font, css in styles];
+  subfonts = [(style + number_name(i), mapline.split()[0]) for style, font, css in styles for i, mapline in enumerate(maplines[style], 1)];
+  maplines = [mapline for style, font, css in styles for mapline in maplines[style]];
+  report['counts']['enc_files'] = len(maplines);
+
+  keys['map'] = digest(generator_digest, maplines);
+  keys['fd']  = digest(generator_digest, subfonts, date.isoformat());
+  keys['sty'] = digest(generator_digest, sty_template_digest, [(style, os.path.basename(font), count) for style, font, count in encfile_counts]);
+
+  # generate the map file
+  with timed_stage('map'):
+    if stage_uptodate('map', keys['map']):
+      print("Map file already up to date");
+    else:
+      stage_record('map', keys['map'], [write_map('fontawesome.map', maplines)]);
+
+  # generate the font definition (.fd) files
+  with timed_stage('fd'):
+    if stage_uptodate('fd', keys['fd']):
+      print("Font definition files already up to date");
     else:
-      doc.write(line);
-template.close();
-doc.close();
-print(" done");
+      stage_record('fd', keys['fd'], [write_fd(subfont_name, tfm_name, date) for subfont_name, tfm_name in subfonts]);
+
+  # package file
+  with timed_stage('sty'):
+    if stage_uptodate('sty', keys['sty']):
+      print("Package file already up to date");
+    else:
+      stage_record('sty', keys['sty'], write_sty(encfile_counts));
+
+  # per-document subset
+  if args.subset:
+    used_icons = sorted(set(icon for path in args.subset for icon in read_used_icons(path)));
+    keys['subset'] = digest(generator_digest, font_digest, catalog_digest, used_icons, date.isoformat(), args.builtin_tfm);
+    with timed_stage('subset'):
+      if stage_uptodate('subset', keys['subset']):
+        print("Pdftex subset already up to date");
+      else:
+        print("Generating the pdftex subset...", end="");
+        outputs, used_icons, subset_glyphs, errors = write_subset(catalog, used_icons, date, not args.builtin_tfm);
+        outputs.append(write_output("otftotfm_errors-subset.log", "% fontawesomesubset.enc\n{}".format(errors) if errors else ''));
+        stage_record('subset', keys['subset'], outputs);
+        print(" done ({} icons, {} glyphs)".format(len(used_icons), len(subset_glyphs)));
+
+  # documentation
+  with timed_stage('doc'):
+    if stage_uptodate('doc', keys['doc']):
+      print("Documentation already up to date");
+    else:
+      print("Generating the documentation...", end="");
+      stage_record('doc', keys['doc'], write_doc(catalog));
+      print(" done");
+
+  if args.archive:
+    close_archive(args.archive);
+    print("Archived {} files into {}".format(len(archived), args.archive));
+
+  finish_report();
+  if args.report:
+    write_report(args.report);
+
+
+# watch mode
+# ------------------------------------------------------------------------------
+# the inputs are polled, which works the same on every platform and filesystem;
+# a change reruns the build in this process, where the build cache skips the
+# stages whose inputs are unchanged, and a failing build doesn't end the session
+WATCH_INTERVAL = 0.2; # seconds
+
+def watched_files(source):
+  files = [os.path.join(TEMPLATES, filename) for filename in sorted(os.listdir(TEMPLATES))];
+  files += [os.path.abspath(FONT), os.path.abspath(CSS)];
+  if source and os.path.isdir(source):
+    files += [os.path.join(source, member) for member in directory_members(source).values()];
+  elif source:
+    files.append(source);
+  for style, font, css in args.style:
+    files += [font, css];
+  return files + args.subset + args.usage;
+
+def file_states(files):
+  states = {};
+  for path in files:
+    try:
+      stat = os.stat(path);
+      states[path] = (stat.st_mtime_ns, stat.st_size);
+    except OSError:
+      states[path] = None;
+  return states;
+
+def watch(version, source, shared):
+  args.force = False; # only the first build is forced
+  states = file_states(watched_files(source));
+  print("Watching {} files for changes (press Ctrl-C to stop)...".format(len(states)));
+  try:
+    while True:
+      time.sleep(WATCH_INTERVAL);
+      current = file_states(watched_files(source));
+      changed = sorted(path for path in set(states) | set(current) if states.get(path) != current.get(path));
+      if not changed:
+        continue;
+      print("\nChanged: {}".format(', '.join(os.path.basename(path) for path in changed)));
+      start = time.perf_counter();
+      failure = None;
+      try:
+        build(version, source, shared_digests());
+        print("Rebuilt in {:.0f} ms".format((time.perf_counter() - start) * 1000));
+      except GenerateError as e:
+        failure = str(e);
+      except Exception as e: # such as a source renamed away by an editor saving it
+        failure = "\n[Error] Build failed: {}: {}".format(type(e).__name__, e);
+      if failure:
+        print(failure);
+        # drop the archive the failed build left open
+        close_archive(args.archive, complete=False);
+      # outputs written by the build, such as the css, don't count as changes
+      states = file_states(watched_files(source));
+  except KeyboardInterrupt:
+    print("\nStopped watching");
+
+# input files are given relative to the current directory, not the output one
+def absolute_options(options):
+  options.mirror = options.mirror and os.path.abspath(options.mirror);
+  options.checksums = options.checksums and os.path.abspath(options.checksums);
+  options.archive = options.archive and os.path.abspath(options.archive);
+  options.report = options.report and os.path.abspath(options.report);
+  options.profile = options.profile and os.path.abspath(options.profile);
+  options.slot_ledger = options.slot_ledger and os.path.abspath(options.slot_ledger);
+  options.check_tfm = options.check_tfm and os.path.abspath(options.check_tfm);
+  options.builtin_tfm = options.builtin_tfm or bool(options.check_tfm); # only the built-in tfm files need checking
+  options.subset = [os.path.abspath(path) for path in options.subset or []];
+  options.usage = [os.path.abspath(path) for path in options.usage or []];
+  options.style = [(style, os.path.abspath(font), os.path.abspath(css)) for style, font, css in options.style];
+  return options;
+
+# library entry point, building one version into out_dir in this process: the
+# font and css are read from sources (a release zip or a directory), or
+# downloaded when it is None, and options takes the command line options by
+# their argument name, such as {'force': True, 'style': [('brands', FONT, CSS)]};
+# returns the run report; errors raise GenerateError
+#
+# a build changes the working directory and the module state (args, cache,
+# report, archive), so calls must be made one after the other, never from
+# several threads at once; use separate processes to build targets side by side
+def generate(version, sources=None, out_dir='.', options=None):
+  global args;
+  defaults = vars(parser.parse_args([version]));
+  unknown = set(options or {}).difference(defaults);
+  if unknown:
+    raise TypeError("unknown options: {}".format(', '.join(sorted(unknown))));
+  args = absolute_options(argparse.Namespace(**dict(defaults, **(options or {}))));
+  if sources and not os.path.exists(sources):
+    raise GenerateError("[Error] No such source: {}".format(sources));
+  invalid = [style for style, font, css in args.style if not valid_style_name(style)];
+  if invalid:
+    raise GenerateError("[Error] Invalid style names: {}".format(', '.join(invalid)));
+  # without sources, the version is resolved as on the command line, so that a
+  # release zip in the mirror is used instead of downloading it again
+  source_version, source = source_files(sources or version);
+  if source_version != version:
+    raise GenerateError("[Error] {} holds version {}, not {}".format(sources, source_version, version));
+  build_tree(version, source, out_dir, args, shared_digests());
+  return json.loads(json.dumps(report));
+
+def main(argv=None):
+  try:
+    run(argv);
+  except GenerateError as e:
+    sys.exit(str(e));
+
+def run(argv):
+  global args;
+  args = absolute_options(parser.parse_args(argv));
+  shared = shared_digests();
+  sources = [source_files(target) for target in args.versions];
+  if len(sources) == 1:
+    build_tree(*sources[0], args.output_dir, args, shared);
+    if args.watch:
+      os.chdir(args.output_dir);
+      watch(*sources[0], shared);
+    return;
+  if args.watch or args.archive:
+    sys.exit("[Error] --{} takes a single version".format('watch' if args.watch else 'archive'));
+
+  versions = [version for version, source in sources];
+  if len(set(versions)) < len(versions):
+    sys.exit("[Error] Versions given more than once: {}".format(', '.join(sorted(set(x for x in versions if versions.count(x) > 1)))));
+  # share the cores between the concurrent builds and their otftotfm runs
+  workers = min(args.jobs, len(sources));
+  args.jobs = max(1, args.jobs // workers);
+  print("Building {} versions...".format(len(sources)));
+  failures = 0;
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = [(version, executor.submit(build_tree, version, source, os.path.join(os.path.abspath(args.output_dir), version), args, shared, 'generate_tex_bindings.log')) for version, source in sources];
+    for version, future in futures:
+      try:
+        future.result();
+        print("  {} done ({})".format(version, os.path.join(args.output_dir, version)));
+      except BaseException as e:
+        failures += 1;
+        print("  [Error] {} failed: {}".format(version, e));
+  if failures:
+    sys.exit("[Error] {} of {} versions failed, see the generate_tex_bindings.log file of each".format(failures, len(sources)));
 
+if __name__ == '__main__':
+  main();
@@ -0,0 +1,168 @@
+# tests of generate_tex_bindings.py, run with pytest; the external tools (curl,
+# otftotfm) are replaced by local stand-ins, so no TeX install or network access
+# is needed
+
+import sys, os, zipfile, importlib.util;
+import pytest;
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)));
+
+# stand-ins
+# ------------------------------------------------------------------------------
+# curl records its calls, and fails after writing part of the file; otftotfm
+# writes an empty tfm and pfb, named like the real ones, and prints the map line
+CURL = """\
+#!/bin/sh
+echo "$@" >> "$(dirname "$0")/curl.log";
+while [ "$#" -gt 0 ]; do
+  if [ "$1" = "-o" ]; then echo "partial download" > "$2"; fi;
+  shift;
+done;
+exit 22;
+""";
+OTFTOTFM = """\
+#!{python}
+import sys, os;
+options = dict(arg.split('=', 1) for arg in sys.argv[2:] if '=' in arg);
+encoding = os.path.splitext(os.path.basename(options['--literal-encoding']))[0];
+open(os.path.join(options['--tfm-directory'], 'FontAwesome--' + encoding + '.tfm'), 'wb').close();
+open(os.path.join(options['--type1-directory'], 'FontAwesome.pfb'), 'wb').close();
+print('FontAwesome--{{0}} FontAwesome "{{0}} ReEncodeFont" <[{{0}}.enc <FontAwesome.pfb'.format(encoding));
+""";
+
+@pytest.fixture
+def tools(tmp_path, monkeypatch):
+  directory = tmp_path / 'bin';
+  directory.mkdir();
+  for name, script in [('curl', CURL), ('otftotfm', OTFTOTFM.format(python=sys.executable))]:
+    (directory / name).write_text(script);
+    (directory / name).chmod(0o755);
+  monkeypatch.setenv('PATH', str(directory) + os.pathsep + os.environ['PATH']);
+  return directory;
+
+@pytest.fixture
+def generator(monkeypatch):
+  monkeypatch.chdir(ROOT);
+  spec = importlib.util.spec_from_file_location('generate_tex_bindings', os.path.join(ROOT, 'generate_tex_bindings.py'));
+  module = importlib.util.module_from_spec(spec);
+  spec.loader.exec_module(module);
+  return module;
+
+# a release zip of the font and css in the repository, laid out as on fontawesome.io
+def release_zip(path, version='4.6.3'):
+  with zipfile.ZipFile(str(path), 'w') as archive:
+    archive.write(os.path.join(ROOT, 'FontAwesome.otf'), 'font-awesome-{}/fonts/FontAwesome.otf'.format(version));
+    archive.write(os.path.join(ROOT, 'FontAwesome.css'), 'font-awesome-{}/css/font-awesome.css'.format(version));
+  return path;
+
+# library entry point
+# ------------------------------------------------------------------------------
+def test_generate_uses_the_mirror(generator, tools, tmp_path):
+  mirror = tmp_path / 'mirror';
+  mirror.mkdir();
+  release_zip(mirror / 'font-awesome-4.6.3.zip');
+  report = generator.generate('4.6.3', out_dir=str(tmp_path / 'out'), options={'mirror': str(mirror)});
+  assert not (tools / 'curl.log').exists();
+  assert not any(entry['command'].startswith('curl') for stage in report['stages'].values() for entry in stage.get('subprocesses', []));
+  assert (tmp_path / 'out' / 'FontAwesome.otf').read_bytes() == open(os.path.join(ROOT, 'FontAwesome.otf'), 'rb').read();
+
+# sources
+# ------------------------------------------------------------------------------
+def test_failed_download_leaves_the_mirror_alone(generator, tools, tmp_path):
+  mirror = tmp_path / 'mirror';
+  mirror.mkdir();
+  with pytest.raises(generator.GenerateError):
+    generator.generate('4.6.3', out_dir=str(tmp_path / 'out'), options={'mirror': str(mirror)});
+  assert (tools / 'curl.log').exists();
+  assert os.listdir(str(mirror)) == [];
+
+def test_broken_mirror_zip_is_an_error(generator, tools, tmp_path):
+  mirror = tmp_path / 'mirror';
+  mirror.mkdir();
+  (mirror / 'font-awesome-4.6.3.zip').write_bytes(b'partial download');
+  with pytest.raises(generator.GenerateError, match='not a zip file'):
+    generator.generate('4.6.3', out_dir=str(tmp_path / 'out'), options={'mirror': str(mirror)});
+
+# run report
+# ------------------------------------------------------------------------------
+def test_failed_build_stops_tracing(generator, tools, tmp_path, monkeypatch):
+  import tracemalloc;
+  monkeypatch.setenv('SOURCE_DATE_EPOCH', 'yesterday');
+  with pytest.raises(generator.GenerateError):
+    generator.generate('4.6.3', ROOT, str(tmp_path / 'out'), {'report': str(tmp_path / 'report.json')});
+  assert not tracemalloc.is_tracing();
+
+def test_subprocesses_are_recorded_per_build(generator, tools, tmp_path):
+  for run in range(2):
+    report = generator.generate('4.6.3', ROOT, str(tmp_path / 'out'), {'force': True});
+  assert len(generator.subprocesses) == report['counts']['subprocesses'];
+
+def test_report_is_relative_to_the_caller(generator, tools, tmp_path, monkeypatch):
+  monkeypatch.chdir(str(tmp_path));
+  generator.generate('4.6.3', ROOT, 'out', {'report': 'report.json'});
+  assert (tmp_path / 'report.json').is_file();
+  assert not (tmp_path / 'out' / 'report.json').exists();
+
+# slot ledger
+# ------------------------------------------------------------------------------
+def test_ledger_run_is_followed_by_a_no_op(generator, tools, tmp_path):
+  ledger = tmp_path / 'slots.json';
+  generator.generate('4.6.3', ROOT, str(tmp_path / 'out'), {'slot_ledger': str(ledger)});
+  written = ledger.stat().st_mtime_ns;
+  report = generator.generate('4.6.3', ROOT, str(tmp_path / 'out'), {'slot_ledger': str(ledger)});
+  assert report['stages']['catalog']['status'] == 'up to date';
+  assert ledger.stat().st_mtime_ns == written;
+
+# styles
+# ------------------------------------------------------------------------------
+@pytest.mark.parametrize('name', ['twenty', 'onehundredt', 'subset', 'Brands'])
+def test_style_names_colliding_with_subfonts_are_rejected(generator, name):
+  assert not generator.valid_style_name(name);
+  with pytest.raises(Exception):
+    generator.parse_style('{}=font.otf:font.css'.format(name));
+
+def test_style_font_does_not_overwrite_the_default(generator, tools, tmp_path):
+  style = tmp_path / 'style';
+  style.mkdir();
+  (style / 'FontAwesome.otf').write_bytes(open(os.path.join(ROOT, 'FontAwesome.otf'), 'rb').read() + b'\0');
+  (style / 'FontAwesome.css').write_text(open(os.path.join(ROOT, 'FontAwesome.css')).read());
+  generator.generate('4.6.3', ROOT, str(tmp_path / 'out'), {'style': [('brands', str(style / 'FontAwesome.otf'), str(style / 'FontAwesome.css'))]});
+  assert (tmp_path / 'out' / 'FontAwesome.otf').read_bytes() == open(os.path.join(ROOT, 'FontAwesome.otf'), 'rb').read();
+  assert (tmp_path / 'out' / 'FontAwesome-brands.otf').read_bytes() == (style / 'FontAwesome.otf').read_bytes();
+  assert '\\newfontfamily{\\FAbrands}{FontAwesome-brands.otf}' in (tmp_path / 'out' / 'fontawesome.sty').read_text();
+
+# built-in tfm files
+# ------------------------------------------------------------------------------
+# no otftotfm tfm is checked in to compare with, so these only check that the
+# tfm files written read back with the dimensions and checksum they were made of
+OTF = {'units_per_em': 1000, 'italic_angle': 0, 'x_height': 500, 'ps_name': 'Synthetic'};
+METRICS = {'a': (500, (0, -100, 500, 700)), 'b': (1000, None), 'space': (250, None)};
+
+def test_builtin_tfm_reads_back(generator):
+  tfm = generator.tfm_file(['.notdef', 'a', 'b', 'missing'], OTF, METRICS, 'FONTAWESOMEONE');
+  lf = int.from_bytes(tfm[:2], 'big');
+  assert len(tfm) == 4 * lf;
+  font = generator.read_tfm(tfm);
+  fix_word = generator.fix_word;
+  assert font['chars'] == {1: (fix_word(.5), fix_word(.7), fix_word(.1), 0, 0, 0), 2: (fix_word(1), 0, 0, 0, 0, 0)};
+  assert font['checksum'] == generator.tfm_checksum(1, 2, {1: fix_word(.5), 2: fix_word(1)});
+  assert (font['design_size'], font['coding_scheme'], font['family']) == (fix_word(10), 'FONTAWESOMEONE', 'Synthetic');
+  assert font['parameters'][1:4] == [fix_word(.25), fix_word(.125), fix_word(.25 / 3)];
+
+def test_check_tfm_reports_differences(generator, tmp_path):
+  (tmp_path / 'reference').mkdir();
+  (tmp_path / 'reference' / 'Synthetic--fontawesomeone.tfm').write_bytes(generator.tfm_file(['.notdef', 'a', 'b'], OTF, METRICS, 'FONTAWESOMEONE'));
+  written = tmp_path / 'Synthetic--fontawesomeone.tfm';
+  written.write_bytes(generator.tfm_file(['.notdef', 'a', 'b'], OTF, dict(METRICS, b=(900, None)), 'FONTAWESOMEONE'));
+  with pytest.raises(generator.GenerateError, match='char 2'):
+    generator.check_tfms([str(written)], str(tmp_path / 'reference'));
+  written.write_bytes((tmp_path / 'reference' / 'Synthetic--fontawesomeone.tfm').read_bytes());
+  assert generator.check_tfms([str(written), str(tmp_path / 'other.tfm')], str(tmp_path / 'reference')) == 1;
+
+# metrics tables
+# ------------------------------------------------------------------------------
+def test_metrics_table_is_framed_like_the_other_files(generator, tools, tmp_path):
+  generator.generate('4.6.3', ROOT, str(tmp_path / 'out'));
+  lines = (tmp_path / 'out' / 'fontawesomemetrics.tex').read_text().splitlines();
+  assert lines[0] == "%% start of file `fontawesomemetrics.tex'.";
+  assert lines[-1] == "%% end of file `fontawesomemetrics.tex'.";